@@ -1,18 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from functools import cached_property
+from typing import TYPE_CHECKING
+
+from dotenv import load_dotenv
 from textual.app import App
 
 from app.screen_state import ScreenContext
+from app.session import Session
+
+if TYPE_CHECKING:
+    from app.stream import NotificationHub
 
 
 class RandomChatApp(App):
     TITLE = "Chat Side Project Type-0"
     CSS_PATH = "app.tcss"
+    BINDINGS = [("f12", "toggle_metrics", "Metrics")]
+
+    def __init__(self, session: Session | None = None) -> None:
+        # services read their settings when first imported, after this
+        load_dotenv()
+        if session is None and (trace := os.getenv("TRACE_FILE")):
+            from app.trace import TraceRecorder
+
+            session = Session(recorder=TraceRecorder(trace))
+        self.session = session or Session()
+        super().__init__()
+
+    @cached_property
+    def notifications(self) -> NotificationHub:
+        """Notifications of the logged in user, for any screen to subscribe to."""
+        from app.stream import NotificationHub
+
+        return NotificationHub(self.session)
 
     def on_mount(self):
         self.screen.visible = False
         self.screen.disabled = True
-        self.screen_context = ScreenContext()
+        self.screen_context = ScreenContext(self)
         self.push_screen(self.screen_context.next()())
 
+    def action_toggle_metrics(self):
+        from app.widgets.metrics import MetricsScreen
+
+        if isinstance(self.screen, MetricsScreen):
+            self.pop_screen()
+        else:
+            self.push_screen(
+                MetricsScreen(self.session.metrics, self.session.resources)
+            )
+
+    async def on_unmount(self):
+        # workers hold the session's sockets, stop them before it closes
+        workers = list(self.workers)
+        self.workers.cancel_all()
+        await asyncio.gather(*(w.wait() for w in workers), return_exceptions=True)
+        if "notifications" in vars(self):
+            await self.notifications.aclose()
+        await self.session.aclose()
+
 
 if __name__ == "__main__":
     RandomChatApp().run()
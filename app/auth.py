@@ -1,35 +1,139 @@
+from __future__ import annotations
+
 import asyncio
-from typing import AsyncGenerator, Generator
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, AsyncGenerator, Generator
 
 from httpx import Auth, Request, Response
 
-from app.cache import Cache
-from app.jwt import JWT, JWTService
+from app import exceptions
+from app.backoff import Backoff
+from app.base import DATA_DIR
+from app.jwt import JWT, Secret
+
+if TYPE_CHECKING:
+    from app.session import Session
+
+
+class TokenManager:
+    """Owner of a session's JWT.
+
+    The token is refreshed `REFRESH_SKEW` seconds before it expires, and
+    concurrent callers that find it missing or expired share one login
+    request. With `PERSIST_TOKEN` set, the token is kept in a user-only file
+    so a restart within its lifetime skips the login request.
+    """
+
+    REFRESH_SKEW = float(os.getenv("JWT_REFRESH_SKEW", default="30"))
+    PERSIST = bool(os.getenv("PERSIST_TOKEN"))
+    TOKEN_PATH = DATA_DIR / "token.json"
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+        self._refreshing: asyncio.Future | None = None
+        self._timer: asyncio.Task | None = None
+        self._backoff = Backoff(base=1.0, cap=60.0)
+        self.refresh_count = 0
+
+    async def login(self, secret: Secret) -> JWT:
+        jwt = self._load(secret)
+        if jwt is None:
+            jwt = await self.session.jwt.login(secret)
+            self._save(secret, jwt)
+        self.session.cache.set("jwt", jwt)
+        self.session.cache.set("secret", secret)
+        if self.session.recorder is not None:
+            self.session.recorder.record("login", user_id=jwt.user_id)
+        self._schedule(jwt)
+        return jwt
+
+    async def get_token(self) -> str:
+        with self.session.metrics.timer("auth_token_seconds"):
+            jwt: JWT | None = self.session.cache.get("jwt")
+            if jwt is None or jwt.expired:
+                jwt = await self.refresh()
+            return jwt.token
+
+    async def refresh(self) -> JWT:
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(self._refresh())
+        return await asyncio.shield(self._refreshing)
+
+    async def aclose(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._refreshing = None
+
+    async def _refresh(self) -> JWT:
+        secret = self.session.cache.get("secret")
+        assert secret
+        jwt = await self.session.jwt.login(secret)
+        self.refresh_count += 1
+        self.session.metrics.inc("jwt_refresh_total")
+        self.session.cache.set("jwt", jwt)
+        self._save(secret, jwt)
+        self._schedule(jwt)
+        return jwt
+
+    def _schedule(self, jwt: JWT):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._backoff.reset()
+        delay = max(jwt.expires_in - self.REFRESH_SKEW, jwt.expires_in / 2)
+        self._timer = self.session.resources.spawn(
+            self._refresh_later(delay), "token refresh"
+        )
+
+    async def _refresh_later(self, delay: float):
+        await asyncio.sleep(max(0, delay))
+        while True:
+            try:
+                await self.refresh()
+            except exceptions.APIError:
+                await asyncio.sleep(self._backoff.next())
+            else:
+                return
+
+    def _load(self, secret: Secret) -> JWT | None:
+        if not self.PERSIST:
+            return None
+        try:
+            with open(self.TOKEN_PATH) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("secret") != _digest(secret):
+            return None
+        jwt = JWT(data["token"])
+        if jwt.expires_in < self.REFRESH_SKEW:
+            return None
+        return jwt
+
+    def _save(self, secret: Secret, jwt: JWT):
+        if not self.PERSIST:
+            return
+        self.TOKEN_PATH.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.TOKEN_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"secret": _digest(secret), "token": jwt.token}, f)
+
+
+def _digest(secret: Secret) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
 
 
 class JWTAuth(Auth):
-    def __init__(self) -> None:
-        self._lock = asyncio.Lock()
+    def __init__(self, tokens: TokenManager) -> None:
+        self.tokens = tokens
 
     def sync_auth_flow(self, request: Request) -> Generator[Request, Response, None]:
         raise RuntimeError("Cannot use a async authentication class with httpx.Client")
 
-    async def async_login(self, secret: str):
-        jwt = await JWTService.login(secret)
-        Cache.set("jwt", jwt)
-        return jwt
-
     async def async_get_token(self) -> str:
-        async with self._lock:
-            secret = Cache.get("secret")
-            assert secret
-            jwt: JWT = Cache.get("jwt")  # type: ignore
-            if jwt is not None:
-                if jwt.expired:
-                    jwt = await self.async_login(secret)
-            else:
-                jwt = await self.async_login(secret)
-        return jwt.token
+        return await self.tokens.get_token()
 
     async def async_auth_flow(
         self, request: Request
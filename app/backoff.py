@@ -0,0 +1,21 @@
+import random
+
+
+class Backoff:
+    """Exponential backoff with full jitter."""
+
+    def __init__(
+        self, base: float = 0.5, cap: float = 30.0, factor: float = 2.0
+    ) -> None:
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self.attempts = 0
+
+    def next(self) -> float:
+        ceiling = min(self.cap, self.base * self.factor**self.attempts)
+        self.attempts += 1
+        return random.uniform(0, ceiling)
+
+    def reset(self):
+        self.attempts = 0
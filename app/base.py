@@ -1,9 +1,23 @@
+from __future__ import annotations
+
 import os
 from abc import ABC
+from functools import wraps
+from importlib.util import find_spec
+from pathlib import Path
+from typing import TYPE_CHECKING, Awaitable, Callable, TypeVar
+
+import httpx
+
+if TYPE_CHECKING:
+    from app.auth import JWTAuth
+    from app.session import Session
+    from app.trace import TraceRecorder
 
-from dotenv import load_dotenv
 
-load_dotenv()
+T = TypeVar("T")
+
+DATA_DIR = Path(os.getenv("DATA_DIR", default=Path.home() / ".local/share/csp0-tui"))
 
 
 class Service(ABC):
@@ -11,3 +25,83 @@ class Service(ABC):
     DOMAIN = os.getenv("DOMAIN", default="localhost:8000")
     BASE_URL = f"https://{DOMAIN}" if SSL else f"http://{DOMAIN}"
     WS_BASE_URL = f"wss://{DOMAIN}" if SSL else f"ws://{DOMAIN}"
+
+    MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", default="10"))
+    MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("MAX_KEEPALIVE_CONNECTIONS", default="5"))
+    KEEPALIVE_EXPIRY = float(os.getenv("KEEPALIVE_EXPIRY", default="30"))
+    HTTP2 = find_spec("h2") is not None
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+    def client(self) -> httpx.AsyncClient:
+        return self.session.pool.client()
+
+    @property
+    def auth(self) -> JWTAuth:
+        return self.session.auth
+
+    def cache_key(self) -> str:
+        """Key cached responses by the logged in user."""
+        return self.session.user_id or ""
+
+
+def instrumented(call: str):
+    """Time a service method into `service_call_seconds` of its session."""
+
+    def decorator(
+        func: Callable[..., Awaitable[T]],
+    ) -> Callable[..., Awaitable[T]]:
+        @wraps(func)
+        async def wrapper(self: Service, *args, **kwargs) -> T:
+            with self.session.metrics.timer("service_call_seconds", call=call):
+                return await func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class ConnectionPool:
+    """HTTP connections to the csp0 server.
+
+    Requests carry their credentials, so one pool can be shared by every
+    session of a process. With a `recorder`, every response is written to its
+    trace.
+    """
+
+    def __init__(
+        self,
+        max_connections: int | None = None,
+        recorder: TraceRecorder | None = None,
+    ) -> None:
+        self.max_connections = max_connections or Service.MAX_CONNECTIONS
+        self.recorder = recorder
+        self._client: httpx.AsyncClient | None = None
+
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=Service.MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=Service.KEEPALIVE_EXPIRY,
+            )
+            transport = None
+            if self.recorder is not None:
+                from app.trace import RecordingTransport
+
+                transport = RecordingTransport(
+                    self.recorder, http2=Service.HTTP2, limits=limits
+                )
+            self._client = httpx.AsyncClient(
+                base_url=Service.BASE_URL,
+                http2=Service.HTTP2,
+                limits=limits,
+                transport=transport,
+            )
+        return self._client
+
+    async def aclose(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
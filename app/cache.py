@@ -1,13 +1,152 @@
-from typing import Any, Optional
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, TypeVar, cast
 
+T = TypeVar("T")
+Key = tuple[str, Hashable]
 
-class Cache:
-    data: dict[str, Any] = {}
+DEFAULT_NAMESPACE = "default"
 
-    @classmethod
-    def set(cls, name: str, value: Any):
-        cls.data[name] = value
 
-    @classmethod
-    def get(cls, name: str) -> Optional[Any]:
-        return cls.data.get(name)
+class TTLCache:
+    """Bounded LRU cache with per-key expiry and namespaces.
+
+    `get_or_compute` collapses concurrent misses on one key into a single
+    call of `compute`; a `delete` or `clear` while it runs discards its result.
+    Hits, misses and evictions are counted per namespace.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data: OrderedDict[Key, tuple[Any, float | None]] = OrderedDict()
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self.evictions: Counter[str] = Counter()
+        self._inflight: dict[Key, asyncio.Future] = {}
+
+    def set(
+        self,
+        name: Hashable,
+        value: Any,
+        ttl: float | None = None,
+        namespace: str = DEFAULT_NAMESPACE,
+    ):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        key = (namespace, name)
+        self.data[key] = (value, expires_at)
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            (evicted_namespace, _), _ = self.data.popitem(last=False)
+            self.evictions[evicted_namespace] += 1
+
+    def get(self, name: Hashable, namespace: str = DEFAULT_NAMESPACE) -> Optional[Any]:
+        key = (namespace, name)
+        entry = self.data.get(key)
+        if entry is None:
+            self.misses[namespace] += 1
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            self.misses[namespace] += 1
+            return None
+        self.data.move_to_end(key)
+        self.hits[namespace] += 1
+        return value
+
+    def delete(self, name: Hashable, namespace: str = DEFAULT_NAMESPACE):
+        self.data.pop((namespace, name), None)
+        self._inflight.pop((namespace, name), None)
+
+    async def get_or_compute(
+        self,
+        name: Hashable,
+        compute: Callable[[], Awaitable[T]],
+        ttl: float | None = None,
+        namespace: str = DEFAULT_NAMESPACE,
+    ) -> T:
+        key = (namespace, name)
+        if key in self.data:
+            value = self.get(name, namespace)
+            if key in self.data:
+                return cast(T, value)
+        else:
+            self.misses[namespace] += 1
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._compute(key, compute, ttl))
+            self._inflight[key] = future
+        return await asyncio.shield(future)
+
+    async def _compute(
+        self, key: Key, compute: Callable[[], Awaitable[T]], ttl: float | None
+    ) -> T:
+        task = asyncio.current_task()
+        try:
+            value = await compute()
+        finally:
+            # the key was invalidated while computing if this is not its task
+            current = self._inflight.get(key) is task
+            if current:
+                del self._inflight[key]
+        if current:
+            namespace, name = key
+            self.set(name, value, ttl, namespace)
+        return value
+
+    def namespace(self, namespace: str) -> "Namespace":
+        return Namespace(self, namespace)
+
+    def clear(self, namespace: str | None = None):
+        if namespace is None:
+            self.data.clear()
+            self._inflight.clear()
+        else:
+            for key in [key for key in self.data if key[0] == namespace]:
+                del self.data[key]
+            for key in [key for key in self._inflight if key[0] == namespace]:
+                del self._inflight[key]
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        namespaces = {ns for ns, _ in self.data} | set(self.hits) | set(self.misses)
+        return {
+            ns: {
+                "size": sum(1 for key in self.data if key[0] == ns),
+                "hits": self.hits[ns],
+                "misses": self.misses[ns],
+                "evictions": self.evictions[ns],
+            }
+            for ns in sorted(namespaces)
+        }
+
+
+class Namespace:
+    """A view of a `TTLCache` restricted to one namespace."""
+
+    def __init__(self, cache: TTLCache, namespace: str) -> None:
+        self.cache = cache
+        self.name = namespace
+
+    def set(self, name: Hashable, value: Any, ttl: float | None = None):
+        self.cache.set(name, value, ttl, self.name)
+
+    def get(self, name: Hashable) -> Optional[Any]:
+        return self.cache.get(name, self.name)
+
+    def delete(self, name: Hashable):
+        self.cache.delete(name, self.name)
+
+    async def get_or_compute(
+        self,
+        name: Hashable,
+        compute: Callable[[], Awaitable[T]],
+        ttl: float | None = None,
+    ) -> T:
+        return await self.cache.get_or_compute(name, compute, ttl, self.name)
+
+    def clear(self):
+        self.cache.clear(self.name)
@@ -20,3 +20,7 @@ class CreateFail(APIError):
 
 class StillWating(APIError):
     msg = "still waiting"
+
+
+class WrongTicket(APIError):
+    msg = "wrong ticket"
@@ -0,0 +1,559 @@
+"""A local stand-in for the csp0 backend.
+
+It speaks the subset of the csp0 protocol this client uses, HTTP, chunked
+streams and websockets on one port, with all state in memory. It is meant for
+end-to-end tests and benchmarks, not as a reference for the real server.
+
+    python -m app.fake_server --port 8000
+    DOMAIN=localhost:8000 python -m app.app
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import AsyncIterator, Awaitable, Callable, Self
+from urllib.parse import parse_qs, urlsplit
+
+import jwt
+from websockets.frames import Opcode
+from websockets.http11 import Request as WSRequest
+from websockets.protocol import State
+from websockets.server import ServerProtocol
+
+SIGNING_KEY = "csp0-fake-server-signing-key-0000"
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: dict[str, list[str]]
+    headers: list[tuple[str, str]]
+    head: bytes
+    body: bytes = b""
+
+    def header(self, name: str) -> str | None:
+        name = name.lower()
+        return next((v for k, v in self.headers if k.lower() == name), None)
+
+    def json(self):
+        return json.loads(self.body)
+
+
+@dataclass
+class Response:
+    status: int = 200
+    body: object = None
+    text: str | None = None
+    stream: AsyncIterator[bytes] | None = None
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, text: str = "") -> None:
+        self.status = status
+        self.text = text or HTTPStatus(status).phrase
+
+
+@dataclass
+class Ticket:
+    id: str
+    user_id: str
+    thread_id: str | None = None
+    matched: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+@dataclass
+class Thread:
+    id: str
+    members: set[str]
+    messages: list[dict] = field(default_factory=list)
+
+
+class WebSocket:
+    """Minimal websocket connection on top of the sans-I/O protocol."""
+
+    def __init__(
+        self,
+        protocol: ServerProtocol,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        self.protocol = protocol
+        self.reader = reader
+        self.writer = writer
+        self.incoming: asyncio.Queue[str | None] = asyncio.Queue()
+
+    async def run(self):
+        """Read frames until the peer goes away."""
+        try:
+            while data := await self.reader.read(65536):
+                self.protocol.receive_data(data)
+                for event in self.protocol.events_received():
+                    if event.opcode is Opcode.TEXT:
+                        self.incoming.put_nowait(event.data.decode())
+                await self._flush()
+                if self.protocol.state is not State.OPEN:
+                    break
+        except ConnectionError:
+            pass
+        self.incoming.put_nowait(None)
+
+    async def recv(self) -> str | None:
+        return await self.incoming.get()
+
+    async def send(self, text: str):
+        self.protocol.send_text(text.encode())
+        await self._flush()
+
+    async def close(self):
+        if self.protocol.state is not State.OPEN:
+            return
+        try:
+            self.protocol.send_close()
+            await self._flush()
+        except ConnectionError:
+            pass
+
+    async def _flush(self):
+        for data in self.protocol.data_to_send():
+            if data:
+                self.writer.write(data)
+            else:
+                # the closing handshake is done, the server hangs up first
+                self.writer.close()
+                return
+        await self.writer.drain()
+
+
+Handler = Callable[..., Awaitable[Response]]
+
+
+class FakeServer:
+    PAGE_SIZE = 50
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        token_ttl: float = 3600,
+        match_timeout: float = 30,
+        ping_interval: float | None = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.token_ttl = token_ttl
+        self.match_timeout = match_timeout
+        self.ping_interval = ping_interval
+        self.secrets: dict[str, str] = {}
+        self.threads: dict[str, Thread] = {}
+        self.tickets: dict[str, Ticket] = {}
+        self.queue: list[Ticket] = []
+        self.notifications: dict[str, list[dict]] = {}
+        self.read_offsets: dict[str, float] = {}
+        self.subscribers: dict[str, set[asyncio.Queue]] = {}
+        self.changed = asyncio.Condition()
+        self.connections: dict[asyncio.Task, asyncio.StreamWriter] = {}
+        routes: list[tuple[str, str, Handler]] = [
+            ("POST", "/users", self.create_user),
+            ("POST", "/tokens", self.create_token),
+            ("GET", "/threads", self.list_threads),
+            ("GET", "/threads/(?P<thread_id>[^/]+)", self.thread_history),
+            ("POST", "/threads/(?P<thread_id>[^/]+)/leave", self.leave_thread),
+            ("POST", "/match", self.start_matching),
+            ("GET", "/match/tickets/(?P<ticket_id>[^/]+)", self.wait_ticket),
+            ("GET", "/tickets", self.list_tickets),
+            ("DELETE", "/tickets/(?P<ticket_id>[^/]+)", self.delete_ticket),
+            ("GET", "/users/me/notifications/read-offset", self.read_offset),
+            ("PATCH", "/users/me/notifications/read-offset", self.set_offset),
+            ("GET", "/users/me/notifications", self.notification_stream),
+        ]
+        self.routes: list[tuple[str, re.Pattern, Handler]] = [
+            (method, re.compile(pattern), handler)
+            for method, pattern, handler in routes
+        ]
+        self.websocket_routes = {
+            "/messages/up": self.messages_up,
+            "/messages/down": self.messages_down,
+        }
+
+    @property
+    def domain(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._connect, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def aclose(self):
+        self.server.close()
+        for task, writer in self.connections.items():
+            writer.transport.abort()
+            # a long poll would not notice that its client is gone
+            task.cancel()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def __aenter__(self) -> Self:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.aclose()
+
+    # HTTP
+
+    async def _connect(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        task = asyncio.current_task()
+        assert task is not None
+        self.connections[task] = writer
+        try:
+            while request := await self._read_request(reader):
+                if (request.header("upgrade") or "").lower() == "websocket":
+                    await self._websocket(request, reader, writer)
+                    return
+                response = await self._dispatch(request)
+                await self._write_response(response, reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # closed by aclose; asyncio logs connection tasks that end cancelled
+            pass
+        finally:
+            self.connections.pop(task, None)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Request | None:
+        line = await reader.readline()
+        if not line:
+            return None
+        head = line
+        method, target, _ = line.decode().split(" ", 2)
+        headers = []
+        while (line := await reader.readline()).strip():
+            head += line
+            name, _, value = line.decode().partition(":")
+            headers.append((name.strip(), value.strip()))
+        url = urlsplit(target)
+        request = Request(method, url.path, parse_qs(url.query), headers, head + line)
+        length = int(request.header("content-length") or 0)
+        request.body = await reader.readexactly(length)
+        return request
+
+    async def _dispatch(self, request: Request) -> Response:
+        for method, pattern, handler in self.routes:
+            match = pattern.fullmatch(request.path)
+            if match and method == request.method:
+                try:
+                    return await handler(request, **match.groupdict())
+                except HTTPError as e:
+                    return Response(e.status, text=e.text)
+        return Response(404, text="not found")
+
+    async def _write_response(
+        self,
+        response: Response,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        try:
+            reason = HTTPStatus(response.status).phrase
+        except ValueError:
+            reason = "Unknown"
+        head = f"HTTP/1.1 {response.status} {reason}\r\n"
+        if response.stream is not None:
+            writer.write(f"{head}Transfer-Encoding: chunked\r\n\r\n".encode())
+            await self._write_stream(response.stream, reader, writer)
+            return
+        if response.text is not None:
+            body, content_type = response.text.encode(), "text/plain"
+        elif response.body is not None:
+            body, content_type = json.dumps(response.body).encode(), "application/json"
+        else:
+            body, content_type = b"", "text/plain"
+        writer.write(
+            f"{head}Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+
+    async def _write_stream(
+        self,
+        stream: AsyncIterator[bytes],
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        async def pump():
+            async for chunk in stream:
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+
+        # the client hangs up to end an endless stream
+        pumping = asyncio.ensure_future(pump())
+        hangup = asyncio.ensure_future(reader.read(1))
+        done, _ = await asyncio.wait(
+            {pumping, hangup}, return_when=asyncio.FIRST_COMPLETED
+        )
+        pumping.cancel()
+        hangup.cancel()
+        if pumping not in done or pumping.cancelled() or pumping.exception():
+            raise ConnectionResetError
+
+    def authenticate(self, request: Request) -> str:
+        scheme, _, token = (request.header("authorization") or "").partition(" ")
+        if scheme != "Bearer":
+            raise HTTPError(401)
+        try:
+            return jwt.decode(token, SIGNING_KEY, algorithms=["HS256"])["id"]
+        except jwt.PyJWTError:
+            raise HTTPError(401)
+
+    async def create_user(self, request: Request) -> Response:
+        secret = uuid.uuid4().hex
+        self.secrets[secret] = uuid.uuid4().hex
+        return Response(201, {"secret": secret})
+
+    async def create_token(self, request: Request) -> Response:
+        user_id = self.secrets.get(request.json().get("secret"))
+        if user_id is None:
+            raise HTTPError(400, "incorrect password")
+        exp = time.time() + self.token_ttl
+        token = jwt.encode({"id": user_id, "exp": exp}, SIGNING_KEY)
+        return Response(200, {"access_token": token})
+
+    async def list_threads(self, request: Request) -> Response:
+        user_id = self.authenticate(request)
+        ids = [t.id for t in self.threads.values() if user_id in t.members]
+        return Response(200, {"ids": ids})
+
+    async def thread_history(self, request: Request, thread_id: str) -> Response:
+        thread = self._member_thread(request, thread_id)
+        before = int(request.query.get("t", [time.time() * 1000])[0]) / 1000
+        msgs = [m for m in thread.messages if m["time"] < before]
+        return Response(200, {"data": msgs[-self.PAGE_SIZE :]})
+
+    async def leave_thread(self, request: Request, thread_id: str) -> Response:
+        thread = self._member_thread(request, thread_id)
+        for member in thread.members:
+            await self.notify(member, "thread_leaved", {"thread_id": thread_id})
+        del self.threads[thread_id]
+        return Response(200, {})
+
+    async def start_matching(self, request: Request) -> Response:
+        user_id = self.authenticate(request)
+        if any(t.user_id == user_id for t in self.queue):
+            raise HTTPError(429)
+        ticket = Ticket(uuid.uuid4().hex, user_id)
+        self.tickets[ticket.id] = ticket
+        self.queue.append(ticket)
+        if len(self.queue) >= 2:
+            await self._pair(self.queue.pop(0), self.queue.pop(0))
+        return Response(200, {"ticket_id": ticket.id})
+
+    async def wait_ticket(self, request: Request, ticket_id: str) -> Response:
+        user_id = self.authenticate(request)
+        ticket = self.tickets.get(ticket_id)
+        if ticket is None or ticket.user_id != user_id:
+            raise HTTPError(403)
+        try:
+            await asyncio.wait_for(ticket.matched.wait(), self.match_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPError(524, "timeout")
+        return Response(200, text=f"{ticket.thread_id}\n")
+
+    async def list_tickets(self, request: Request) -> Response:
+        user_id = self.authenticate(request)
+        tickets = [
+            {"id": t.id, "thread_id": t.thread_id}
+            for t in self.tickets.values()
+            if t.user_id == user_id
+        ]
+        return Response(200, tickets)
+
+    async def delete_ticket(self, request: Request, ticket_id: str) -> Response:
+        user_id = self.authenticate(request)
+        ticket = self.tickets.get(ticket_id)
+        if ticket is None or ticket.user_id != user_id:
+            raise HTTPError(404)
+        del self.tickets[ticket_id]
+        if ticket in self.queue:
+            self.queue.remove(ticket)
+        return Response(204)
+
+    async def read_offset(self, request: Request) -> Response:
+        user_id = self.authenticate(request)
+        return Response(200, {"offset": self.read_offsets.get(user_id, 0.0)})
+
+    async def set_offset(self, request: Request) -> Response:
+        user_id = self.authenticate(request)
+        self.read_offsets[user_id] = request.json()["new_offset"] / 1000
+        return Response(200, {})
+
+    async def notification_stream(self, request: Request) -> Response:
+        user_id = self.authenticate(request)
+        offset = float(request.query.get("t", [0])[0])
+
+        async def stream() -> AsyncIterator[bytes]:
+            sent = 0
+            while True:
+                pending = [
+                    n
+                    for n in self.notifications.get(user_id, [])[sent:]
+                    if n["time"] > offset
+                ]
+                sent = len(self.notifications.get(user_id, []))
+                if pending:
+                    yield b"".join(json.dumps(n).encode() for n in pending)
+                async with self.changed:
+                    if sent == len(self.notifications.get(user_id, [])):
+                        await self.changed.wait()
+
+        return Response(200, stream=stream())
+
+    async def notify(self, user_id: str, code: str, details: dict):
+        notification = {"code": code, "time": time.time(), "details": details}
+        self.notifications.setdefault(user_id, []).append(notification)
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def _pair(self, first: Ticket, second: Ticket):
+        thread = Thread(uuid.uuid4().hex, {first.user_id, second.user_id})
+        self.threads[thread.id] = thread
+        for ticket in (first, second):
+            ticket.thread_id = thread.id
+            ticket.matched.set()
+            await self.notify(ticket.user_id, "thread_joined", {"thread_id": thread.id})
+
+    def _member_thread(self, request: Request, thread_id: str) -> Thread:
+        user_id = self.authenticate(request)
+        thread = self.threads.get(thread_id)
+        if thread is None or user_id not in thread.members:
+            raise HTTPError(404)
+        return thread
+
+    # websockets
+
+    async def _websocket(
+        self,
+        request: Request,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        handler = self.websocket_routes.get(request.path)
+        protocol = ServerProtocol()
+        try:
+            user_id = self.authenticate(request)
+        except HTTPError:
+            user_id = None
+        protocol.receive_data(request.head)
+        (ws_request,) = protocol.events_received()
+        assert isinstance(ws_request, WSRequest)
+        if handler is None or user_id is None:
+            response = protocol.reject(401 if handler else 404, "rejected\n")
+        else:
+            response = protocol.accept(ws_request)
+        protocol.send_response(response)
+        ws = WebSocket(protocol, reader, writer)
+        await ws._flush()
+        if handler is None or user_id is None:
+            return
+        reading = asyncio.create_task(ws.run())
+        pinging = asyncio.create_task(self._ping(ws))
+        try:
+            await handler(ws, user_id)
+        finally:
+            pinging.cancel()
+            reading.cancel()
+            await ws.close()
+
+    async def _ping(self, ws: WebSocket):
+        if self.ping_interval is None:
+            return
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await ws.send("PING")
+
+    async def messages_up(self, ws: WebSocket, user_id: str):
+        while (frame := await ws.recv()) is not None:
+            if frame == "PONG":
+                continue
+            data = json.loads(frame)
+            thread = self.threads.get(data["tid"])
+            if thread is None or user_id not in thread.members:
+                continue
+            last = thread.messages[-1]["time"] if thread.messages else 0
+            msg = {
+                "id": uuid.uuid4().hex,
+                "uid": user_id,
+                "text": data["text"],
+                "time": max(time.time(), last + 1e-6),
+                "tid": thread.id,
+            }
+            thread.messages.append(msg)
+            for queue in self.subscribers.get(thread.id, ()):
+                queue.put_nowait(msg)
+
+    async def messages_down(self, ws: WebSocket, user_id: str):
+        frame = await ws.recv()
+        if frame is None:
+            return
+        offset: dict[str, float] = json.loads(frame)
+        queue: asyncio.Queue = asyncio.Queue()
+        thread_ids = [
+            tid
+            for tid in offset
+            if tid in self.threads and user_id in self.threads[tid].members
+        ]
+        for tid in thread_ids:
+            self.subscribers.setdefault(tid, set()).add(queue)
+        try:
+            for tid in thread_ids:
+                for msg in self.threads[tid].messages:
+                    if msg["time"] > offset[tid]:
+                        await ws.send(json.dumps(msg))
+            closed = asyncio.ensure_future(self._until_closed(ws))
+            while not closed.done():
+                getting = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getting, closed}, return_when="FIRST_COMPLETED")
+                if getting.done():
+                    await ws.send(json.dumps(getting.result()))
+                else:
+                    getting.cancel()
+        finally:
+            for tid in thread_ids:
+                self.subscribers[tid].discard(queue)
+
+    async def _until_closed(self, ws: WebSocket):
+        while await ws.recv() is not None:
+            pass
+
+
+async def serve(host: str, port: int):
+    async with FakeServer(host, port) as server:
+        print(f"fake csp0 server on {server.domain}")
+        await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(prog="python -m app.fake_server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,55 @@
+import json
+
+
+class JSONFramer:
+    """Split a text stream into JSON documents.
+
+    Chunks may cut a document anywhere or carry several of them; documents can
+    be separated by newlines or simply concatenated. A document that can never
+    be completed is skipped up to the next line or object, and counted in
+    `skipped`, so it does not hold back the ones after it.
+    """
+
+    # characters that end a token, so an error before them is not a cut
+    _DELIMITERS = frozenset('{}[],:"')
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._decoder = json.JSONDecoder()
+        self.skipped = 0
+
+    def feed(self, chunk: str) -> list:
+        self._buffer += chunk
+        docs = []
+        pos = 0
+        while True:
+            while pos < len(self._buffer) and self._buffer[pos].isspace():
+                pos += 1
+            if pos == len(self._buffer):
+                break
+            try:
+                doc, pos = self._decoder.raw_decode(self._buffer, pos)
+            except json.JSONDecodeError as e:
+                if self._incomplete(e):
+                    break
+                self.skipped += 1
+                pos = self._resync(pos, e.pos)
+                continue
+            docs.append(doc)
+        self._buffer = self._buffer[pos:]
+        return docs
+
+    def _incomplete(self, error: json.JSONDecodeError) -> bool:
+        """Whether more input could still complete the document."""
+        if error.msg.startswith("Unterminated string"):
+            return True
+        rest = self._buffer[error.pos :]
+        return not any(c in self._DELIMITERS or c.isspace() for c in rest)
+
+    def _resync(self, start: int, error: int) -> int:
+        """Position of the next document after an invalid one."""
+        newline = self._buffer.find("\n", error)
+        if newline != -1:
+            return newline + 1
+        brace = self._buffer.find("{", start + 1)
+        return brace if brace != -1 else len(self._buffer)
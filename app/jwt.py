@@ -7,31 +7,25 @@ import httpx
 from jwt import decode
 
 from app import exceptions
-from app.base import Service
-from app.cache import Cache
+from app.base import Service, instrumented
 
 Token: TypeAlias = str
 Secret: TypeAlias = str
 
 
 class JWTService(Service):
-    @classmethod
-    async def login(cls, secret: Secret) -> JWT:
-        async with httpx.AsyncClient(base_url=cls.BASE_URL) as client:
-            try:
-                resp = await client.post("/tokens", json={"secret": secret})
-            except httpx.HTTPError as e:
-                raise exceptions.NetworkError from e
+    @instrumented("jwt.login")
+    async def login(self, secret: Secret) -> JWT:
+        try:
+            resp = await self.client().post("/tokens", json={"secret": secret})
+        except httpx.HTTPError as e:
+            raise exceptions.NetworkError from e
         if resp.status_code == httpx.codes.BAD_REQUEST:
             raise exceptions.IncorrectPassword
         elif resp.status_code != httpx.codes.OK:
-            print(resp.text)
-            raise exceptions.ServiceError
+            raise exceptions.ServiceError(resp.text)
         else:
-            jwt = JWT(resp.json()["access_token"])
-            Cache.set("jwt", jwt)
-            Cache.set("secret", secret)
-            return jwt
+            return JWT(resp.json()["access_token"])
 
 
 class JWT:
@@ -44,3 +38,7 @@ class JWT:
     @property
     def expired(self) -> bool:
         return datetime.now(timezone.utc) > self.exp
+
+    @property
+    def expires_in(self) -> float:
+        return (self.exp - datetime.now(timezone.utc)).total_seconds()
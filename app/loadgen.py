@@ -0,0 +1,221 @@
+"""Headless load generator built on the client's own service layer.
+
+Each simulated user signs up, logs in, matches with another one and then
+sends messages at a fixed rate, while reading its partner's messages from
+the downstream socket. All users share one event loop and one connection pool.
+
+    python -m app.loadgen --domain localhost:8000 --users 50 --rate 2 --duration 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from dotenv import load_dotenv
+
+from app import exceptions
+from app.metrics import Histogram
+from app.session import Session
+
+
+@dataclass
+class Report:
+    users: int
+    duration: float
+    sent: int = 0
+    delivered: int = 0
+    unmatched: int = 0
+    errors: Counter[str] = field(default_factory=Counter)
+    latency: dict[str, Histogram] = field(
+        default_factory=lambda: {
+            stage: Histogram() for stage in ("login", "match", "message")
+        }
+    )
+
+    @property
+    def lost(self) -> int:
+        return self.sent - self.delivered
+
+    def to_dict(self) -> dict:
+        return {
+            "users": self.users,
+            "duration": self.duration,
+            "sent": self.sent,
+            "delivered": self.delivered,
+            "lost": self.lost,
+            "unmatched": self.unmatched,
+            "sent_per_second": self.sent / self.duration,
+            "delivered_per_second": self.delivered / self.duration,
+            "errors": dict(self.errors),
+            "latency": {k: h.summary() for k, h in self.latency.items()},
+        }
+
+    def render(self) -> str:
+        lines = [
+            f"users {self.users}, duration {self.duration:.1f}s",
+            f"sent {self.sent} ({self.sent / self.duration:.1f}/s), "
+            f"delivered {self.delivered} ({self.delivered / self.duration:.1f}/s), "
+            f"lost {self.lost}, unmatched {self.unmatched}",
+        ]
+        if self.errors:
+            lines.append("errors:")
+            lines += [f"  {name}: {n}" for name, n in self.errors.most_common()]
+        else:
+            lines.append("errors: none")
+        for stage, histogram in self.latency.items():
+            s = histogram.summary()
+            lines.append(
+                f"{stage} latency: n={s['count']} p50={s['p50'] * 1000:.1f}ms "
+                f"p90={s['p90'] * 1000:.1f}ms p99={s['p99'] * 1000:.1f}ms "
+                f"max={s['max'] * 1000:.1f}ms"
+            )
+            if histogram.count:
+                lines.append(histogram.render())
+        return "\n".join(lines)
+
+
+class LoadGenerator:
+    DRAIN_TIMEOUT = 5.0
+
+    def __init__(self, users: int, rate: float, duration: float) -> None:
+        self.users = users
+        self.rate = rate
+        self.duration = duration
+        self.report = Report(users, duration)
+        from app.base import ConnectionPool
+
+        self.pool = ConnectionPool(max_connections=users * 2)
+        self.sent_at: dict[str, float] = {}
+        self.deadline = 0.0
+        self.senders = 0
+
+    async def run(self) -> Report:
+        # users still waiting for a partner give up when the run ends
+        self.deadline = time.monotonic() + self.duration
+        bots = [asyncio.create_task(self.bot(i)) for i in range(self.users)]
+        try:
+            await asyncio.gather(*bots)
+        finally:
+            await self.pool.aclose()
+        self.report.delivered = self.report.sent - len(self.sent_at)
+        return self.report
+
+    async def bot(self, index: int):
+        session = Session(self.pool)
+        try:
+            await self._run_bot(session, index)
+        except Exception as e:
+            self.report.errors[type(e).__name__] += 1
+        finally:
+            await session.aclose()
+
+    async def _run_bot(self, session: Session, index: int):
+        started = time.perf_counter()
+        secret = await session.users.create()
+        await session.tokens.login(secret)
+        self.report.latency["login"].observe(time.perf_counter() - started)
+
+        joined_at = time.time()
+        started = time.perf_counter()
+        ticket_id = await session.users.start_matching()
+        thread_id = None
+        while thread_id is None and time.monotonic() < self.deadline:
+            try:
+                thread_id = await asyncio.wait_for(
+                    session.tickets.wait_matching_result(ticket_id),
+                    self.deadline - time.monotonic(),
+                )
+            except TimeoutError:
+                continue
+        await session.tickets.delete_ticket(ticket_id)
+        if thread_id is None:
+            self.report.unmatched += 1
+            return
+        self.report.latency["match"].observe(time.perf_counter() - started)
+
+        receiving = asyncio.create_task(self._receive(session, thread_id, joined_at))
+        self.senders += 1
+        try:
+            try:
+                await self._send(session, thread_id, index)
+            finally:
+                self.senders -= 1
+            # partners may still be sending, keep reading until all are done
+            while self.senders:
+                await asyncio.sleep(0.05)
+            deadline = time.monotonic() + self.DRAIN_TIMEOUT
+            while self.sent_at and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+        finally:
+            receiving.cancel()
+            await asyncio.gather(receiving, return_exceptions=True)
+
+    async def _send(self, session: Session, thread_id: str, index: int):
+        interval = 1 / self.rate
+        deadline = time.monotonic() + self.duration
+        seq = 0
+        while time.monotonic() < deadline:
+            text = f"bot {index} message {seq}"
+            seq += 1
+            self.sent_at[text] = time.perf_counter()
+            self.report.sent += 1
+            try:
+                await session.uplink.send(thread_id, text)
+            except exceptions.APIError as e:
+                self.sent_at.pop(text, None)
+                self.report.sent -= 1
+                self.report.errors[f"send: {type(e).__name__}"] += 1
+            await asyncio.sleep(interval)
+
+    async def _receive(self, session: Session, thread_id: str, since: float):
+        from app.stream import MessageDownlink
+
+        def on_state(connected: bool):
+            if not connected:
+                self.report.errors["receive: disconnected"] += 1
+
+        downlink = MessageDownlink(session, {thread_id: since}, on_state=on_state)
+        async for msg in downlink:
+            if msg.user_id == session.user_id:
+                continue
+            sent_at = self.sent_at.pop(msg.message, None)
+            if sent_at is not None:
+                self.report.latency["message"].observe(time.perf_counter() - sent_at)
+
+
+def main(argv: list[str] | None = None) -> int:
+    # app.base reads its settings when first imported, so the network modules
+    # are imported once .env is loaded
+    load_dotenv()
+    from app.base import Service
+
+    parser = argparse.ArgumentParser(prog="python -m app.loadgen")
+    parser.add_argument("--domain", default=Service.DOMAIN)
+    parser.add_argument("--ssl", action="store_true")
+    parser.add_argument("--users", type=int, default=10, help="an even number")
+    parser.add_argument(
+        "--rate", type=float, default=1.0, help="messages per second per user"
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args(argv)
+    if args.users % 2:
+        parser.error("--users must be even, users are matched in pairs")
+
+    scheme = "s" if args.ssl else ""
+    Service.BASE_URL = f"http{scheme}://{args.domain}"
+    Service.WS_BASE_URL = f"ws{scheme}://{args.domain}"
+    generator = LoadGenerator(args.users, args.rate, args.duration)
+    report = asyncio.run(generator.run())
+    print(json.dumps(report.to_dict(), indent=2) if args.json else report.render())
+    return 1 if report.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+import bisect
+import json
+import math
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# upper bounds in seconds, from 1ms to 10s
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    math.inf,
+)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram.
+
+    Memory does not grow with the number of samples, so it can stay on for a
+    whole session. Quantiles are interpolated within a bucket.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = min(self.buckets[i], self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+    def render(self, width: int = 40) -> str:
+        """Draw the non-empty buckets as text bars."""
+        peak = max(self.counts) or 1
+        lines = []
+        for bound, count in zip(self.buckets, self.counts):
+            if not count:
+                continue
+            label = "+inf" if bound == math.inf else f"{bound * 1000:g}ms"
+            bar = "#" * max(1, round(count / peak * width))
+            lines.append(f"  <= {label:>8} {count:>7} {bar}")
+        return "\n".join(lines)
+
+
+Labels = tuple[tuple[str, str], ...]
+Key = tuple[str, Labels]
+
+
+def _key(name: str, labels: dict[str, str]) -> Key:
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: Labels, **extra: str) -> str:
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    """Counters and latency histograms of one session, keyed by name and labels.
+
+    Names follow the Prometheus conventions: `_total` for counters and
+    `_seconds` for histograms.
+    """
+
+    def __init__(self) -> None:
+        self.counters: dict[Key, float] = {}
+        self.histograms: dict[Key, Histogram] = {}
+
+    def inc(self, name: str, amount: float = 1, /, **labels: str):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, /, **labels: str):
+        self.histogram(name, **labels).observe(seconds)
+
+    def counter(self, name: str, /, **labels: str) -> float:
+        return self.counters.get(_key(name, labels), 0)
+
+    def histogram(self, name: str, /, **labels: str) -> Histogram:
+        key = _key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        return histogram
+
+    @contextmanager
+    def timer(self, name: str, /, **labels: str) -> Iterator[None]:
+        """Observe the duration of the block, and count the errors it raises.
+
+        Cancelled blocks are not observed, since their duration says nothing
+        about the work being timed.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            errors = name.removesuffix("_seconds") + "_errors_total"
+            self.inc(errors, 1, **{**labels, "error": type(e).__name__})
+            self.observe(name, time.perf_counter() - started, **labels)
+            raise
+        else:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ],
+            "histograms": [
+                {"name": name, "labels": dict(labels), **histogram.summary()}
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """The snapshot in the Prometheus text exposition format."""
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else f"{bound:g}"
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels, le=le)} {cumulative}"
+                )
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:g}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def render(self) -> str:
+        """One line per counter and histogram, for the debug panel."""
+        lines = []
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            s = histogram.summary()
+            lines.append(
+                f"{name}{_format_labels(labels)} n={s['count']} "
+                f"p50={s['p50'] * 1000:.1f}ms p90={s['p90'] * 1000:.1f}ms "
+                f"p99={s['p99'] * 1000:.1f}ms max={s['max'] * 1000:.1f}ms"
+            )
+        return "\n".join(lines) or "no samples yet"
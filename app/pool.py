@@ -0,0 +1,192 @@
+"""Pre-forked app processes for textual-web.
+
+textual-web starts its configured command once per session, so every visitor
+would pay for interpreter start-up and the Textual imports. `serve` imports the
+app once and keeps `--size` forked copies blocked on a unix socket. `connect`
+is the per-session command: a stdlib-only launcher that hands its stdio, cwd
+and environment to one of them and relays the exit code. Without a running
+pool it starts the app itself, like `python -m app.app`. Workers idle for
+longer than `--idle-timeout` seconds are replaced by fresh forks.
+
+    python -m app.pool serve --size 4 --socket /tmp/csp0.sock
+    python -m app.pool connect --socket /tmp/csp0.sock
+"""
+
+import argparse
+import json
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+import traceback
+
+SOCKET_PATH = os.getenv("POOL_SOCKET", default="/tmp/csp0-tui.sock")
+POOL_SIZE = int(os.getenv("POOL_SIZE", default="4"))
+IDLE_TIMEOUT = float(os.getenv("POOL_IDLE_TIMEOUT", default="600"))
+
+# imported by `serve` before forking, so sessions start with them loaded
+PRELOAD = (
+    "app.app",
+    "app.widgets.login",
+    "app.widgets.match",
+    "app.widgets.chat",
+    "app.stream",
+)
+
+
+class Pool:
+    def __init__(self, path: str, size: int, idle_timeout: float) -> None:
+        self.path = path
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.idle: set[int] = set()
+        self.running = True
+
+    def serve(self):
+        from importlib import import_module
+
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        for name in PRELOAD:
+            import_module(name)
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(self.size * 4)
+        self.taken_r, self.taken_w = os.pipe()
+        signal.signal(signal.SIGTERM, lambda *_: self.stop())
+        signal.signal(signal.SIGINT, lambda *_: self.stop())
+        try:
+            while self.running:
+                self.reap()
+                while len(self.idle) < self.size:
+                    self.spawn()
+                try:
+                    ready, _, _ = select.select([self.taken_r], [], [], 1.0)
+                except InterruptedError:
+                    continue
+                if ready:
+                    for pid in os.read(self.taken_r, 4096).split():
+                        self.idle.discard(int(pid))
+        finally:
+            for pid in self.idle:
+                os.kill(pid, signal.SIGTERM)
+            self.sock.close()
+            os.unlink(self.path)
+
+    def stop(self):
+        self.running = False
+
+    def reap(self):
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self.idle.discard(pid)
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.idle.add(pid)
+            return
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        os.close(self.taken_r)
+        code = 1
+        try:
+            code = self.work()
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(code)
+
+    def work(self) -> int:
+        if self.idle_timeout > 0:
+            self.sock.settimeout(self.idle_timeout)
+        try:
+            conn, _ = self.sock.accept()
+        except TimeoutError:
+            return 0
+        os.write(self.taken_w, b"%d\n" % os.getpid())
+        self.sock.close()
+        conn.settimeout(None)
+        payload, fds, _, _ = socket.recv_fds(conn, 1 << 20, 3)
+        session = json.loads(payload)
+        return run_session(conn, fds, session["env"], session["cwd"])
+
+
+def run_session(conn: socket.socket, fds: list[int], env: dict, cwd: str) -> int:
+    """Run the app on the launcher's stdio, in its environment."""
+    from importlib import reload
+
+    import textual.constants
+
+    from app.app import RandomChatApp
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.environ.clear()
+    os.environ.update(env)
+    os.chdir(cwd)
+    # Textual reads TEXTUAL_DRIVER and friends when it is imported
+    reload(textual.constants)
+
+    def watch_launcher():
+        # the launcher only closes its end if textual-web killed it
+        if not conn.recv(1):
+            os._exit(1)
+
+    threading.Thread(target=watch_launcher, daemon=True).start()
+    app = RandomChatApp()
+    app.run()
+    code = app.return_code or 0
+    conn.sendall(b"%d\n" % code)
+    return code
+
+
+def connect(path: str) -> int:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        # no pool is serving, so pay for a cold start rather than fail the session
+        sock.close()
+        os.execv(sys.executable, [sys.executable, "-m", "app.app"])
+    session = {"env": dict(os.environ), "cwd": os.getcwd()}
+    socket.send_fds(sock, [json.dumps(session).encode()], [0, 1, 2])
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(1))
+    reply = sock.makefile().readline()
+    return int(reply) if reply else 1
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.pool")
+    parser.add_argument("command", choices=["serve", "connect"])
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--size", type=int, default=POOL_SIZE)
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=IDLE_TIMEOUT,
+        help="seconds before an unused worker is replaced, 0 to keep forever",
+    )
+    args = parser.parse_args(argv)
+    if args.command == "connect":
+        return connect(args.socket)
+    Pool(args.socket, args.size, args.idle_timeout).serve()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
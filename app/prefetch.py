@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, List, TypeVar
+
+from app.session import Session
+from app.user import ThreadID, ThreadMessage
+
+T = TypeVar("T")
+
+
+def prefetch(aw: Awaitable[T]) -> asyncio.Future[T]:
+    """Start `aw` in the background; an unused failure is not reported."""
+    future = asyncio.ensure_future(aw)
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    return future
+
+
+@dataclass
+class HistoryPrefetch:
+    """Initial history request started before the chat screen exists."""
+
+    offset: float
+    messages: asyncio.Future[List[ThreadMessage]]
+
+    @classmethod
+    def start(cls, session: Session, thread_id: ThreadID) -> HistoryPrefetch:
+        offset = time.time()
+        return cls(
+            offset, prefetch(session.threads.fetch_old_messages(thread_id, offset))
+        )
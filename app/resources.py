@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+import warnings
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncContextManager, AsyncIterator, Coroutine, Iterator, TypeVar
+
+T = TypeVar("T")
+
+SOCKET = "socket"
+STREAM = "stream"
+TASK = "task"
+
+
+class Resources:
+    """Live sockets, streams and tasks of a session.
+
+    Network code opens every connection through `track` and starts its
+    background tasks with `spawn`, so `counts` shows what is open at any
+    moment. Screens own their workers, which Textual cancels when they are
+    removed; sockets opened by those workers are still counted here.
+    """
+
+    def __init__(self) -> None:
+        self.live: Counter[str] = Counter()
+        self.tasks: set[asyncio.Task] = set()
+
+    @contextmanager
+    def hold(self, kind: str) -> Iterator[None]:
+        """Count a socket or stream as open for the duration of the block."""
+        self.live[kind] += 1
+        try:
+            yield
+        finally:
+            self.live[kind] -= 1
+
+    @asynccontextmanager
+    async def track(
+        self, kind: str, manager: AsyncContextManager[T]
+    ) -> AsyncIterator[T]:
+        """Enter `manager`, a socket or stream, and count it while it is open."""
+        with self.hold(kind):
+            async with manager as resource:
+                yield resource
+
+    def spawn(self, coro: Coroutine, name: str | None = None) -> asyncio.Task:
+        task = asyncio.create_task(coro, name=name)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def counts(self) -> dict[str, int]:
+        return {
+            SOCKET: self.live[SOCKET],
+            STREAM: self.live[STREAM],
+            TASK: len(self.tasks),
+        }
+
+    async def aclose(self):
+        """Cancel the tasks still running, and warn about what was left open."""
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        leaked = {kind: n for kind, n in self.counts().items() if n}
+        if leaked:
+            warnings.warn(f"session closed with {leaked} still open", ResourceWarning)
@@ -1,47 +1,83 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Type
+from typing import TYPE_CHECKING, Type
 
 from textual.screen import Screen
 
-from app.widgets.chat import ChatScreen
-from app.widgets.login import LoginScreen
-from app.widgets.match import MatchScreen
+if TYPE_CHECKING:
+    from textual.app import App
+
+
+# Screens are imported by the state that first needs them, so only the login
+# screen is loaded at start-up.
 
 
 class ScreenState(ABC):
+    @abstractmethod
+    def screen(self) -> Type[Screen]:
+        """The screen this state moves to, without moving to it."""
+        raise NotImplementedError
+
     @abstractmethod
     def next(self, context: ScreenContext):
         raise NotImplementedError
 
 
 class StartState(ScreenState):
+    def screen(self) -> Type[Screen]:
+        from app.widgets.login import LoginScreen
+
+        return LoginScreen
+
     def next(self, context: ScreenContext) -> Type[Screen]:
         context.set_state(LoginState())
-        return LoginScreen
+        return self.screen()
 
 
 class LoginState(ScreenState):
+    def screen(self) -> Type[Screen]:
+        from app.widgets.match import MatchScreen
+
+        return MatchScreen
+
     def next(self, context: ScreenContext) -> Type[Screen]:
         context.set_state(MatchingState())
-        return MatchScreen
+        return self.screen()
 
 
 class MatchingState(ScreenState):
+    def screen(self) -> Type[Screen]:
+        from app.widgets.chat import ChatScreen
+
+        return ChatScreen
+
     def next(self, context: ScreenContext) -> Type[Screen]:
         context.set_state(ChatState())
-        return ChatScreen
+        return self.screen()
 
 
 class ChatState(ScreenState):
+    def screen(self) -> Type[Screen]:
+        from app.widgets.match import MatchScreen
+
+        return MatchScreen
+
     def next(self, context: ScreenContext) -> Type[Screen]:
         context.set_state(MatchingState())
-        return MatchScreen
+        return self.screen()
 
 
 class ScreenContext:
-    def __init__(self) -> None:
+    """Moves the app between screens.
+
+    Screens with a `reset` method are installed under their class name when
+    first built, and later transitions reset them instead of composing a new
+    widget tree.
+    """
+
+    def __init__(self, app: App | None = None) -> None:
+        self.app = app
         self._current_state: ScreenState = StartState()
 
     def set_state(self, state: ScreenState):
@@ -49,3 +85,34 @@ class ScreenContext:
 
     def next(self) -> Type[Screen]:
         return self._current_state.next(self)
+
+    def peek(self) -> Type[Screen]:
+        """The screen `next` would return, without moving to it."""
+        return self._current_state.screen()
+
+    def screen(self, screen_class: Type[Screen], *args, **kwargs) -> Screen:
+        assert self.app is not None
+        if not hasattr(screen_class, "reset"):
+            return screen_class(*args, **kwargs)
+        name = screen_class.__name__
+        if self.app.is_screen_installed(name):
+            screen = self.app.get_screen(name)
+            screen.reset(*args, **kwargs)  # type: ignore
+        else:
+            screen = screen_class(*args, **kwargs)
+            self.app.install_screen(screen, name)
+        return screen
+
+    def prewarm(self, *args, **kwargs) -> Screen:
+        """Build, install and mount the next screen before it is shown.
+
+        The screen is mounted by pushing and at once popping it in one batch,
+        so it never paints. Being installed, it keeps running off the stack.
+        """
+        assert self.app is not None
+        screen = self.screen(self.peek(), *args, **kwargs)
+        if not screen.is_running:
+            with self.app.batch_update():
+                self.app.push_screen(screen)
+                self.app.pop_screen()
+        return screen
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from functools import cached_property
+from typing import TYPE_CHECKING
+
+from app.cache import TTLCache
+from app.metrics import Metrics
+from app.resources import Resources
+
+if TYPE_CHECKING:
+    from app.auth import JWTAuth, TokenManager
+    from app.base import ConnectionPool
+    from app.jwt import JWTService
+    from app.stream import MessageUplink
+    from app.ticket import TicketService
+    from app.trace import TraceRecorder
+    from app.user import NotificationService, ThreadService, UserService
+
+
+class Session:
+    """Everything one user of the app owns.
+
+    The token, caches, services and sockets hang off a session rather than
+    module globals, so one process can host many users. Sessions may share a
+    `ConnectionPool`; without one, a session opens its own. Services are
+    created on first use, which keeps the network modules out of start-up.
+    `metrics` collects the timings of everything the session does,
+    `resources` counts its open sockets, streams and tasks, and a
+    `recorder` writes the traffic of its own pool and sockets to a trace.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool | None = None,
+        recorder: TraceRecorder | None = None,
+    ) -> None:
+        self.cache = TTLCache()
+        self.metrics = Metrics()
+        self.resources = Resources()
+        self.recorder = recorder
+        self._shared_pool = pool
+
+    @property
+    def user_id(self) -> str | None:
+        jwt = self.cache.get("jwt")
+        return jwt.user_id if jwt is not None else None
+
+    @cached_property
+    def pool(self) -> ConnectionPool:
+        if self._shared_pool is not None:
+            return self._shared_pool
+        from app.base import ConnectionPool
+
+        return ConnectionPool(recorder=self.recorder)
+
+    @cached_property
+    def tokens(self) -> TokenManager:
+        from app.auth import TokenManager
+
+        return TokenManager(self)
+
+    @cached_property
+    def auth(self) -> JWTAuth:
+        from app.auth import JWTAuth
+
+        return JWTAuth(self.tokens)
+
+    @cached_property
+    def jwt(self) -> JWTService:
+        from app.jwt import JWTService
+
+        return JWTService(self)
+
+    @cached_property
+    def users(self) -> UserService:
+        from app.user import UserService
+
+        return UserService(self)
+
+    @cached_property
+    def notifications(self) -> NotificationService:
+        from app.user import NotificationService
+
+        return NotificationService(self)
+
+    @cached_property
+    def threads(self) -> ThreadService:
+        from app.user import ThreadService
+
+        return ThreadService(self)
+
+    @cached_property
+    def tickets(self) -> TicketService:
+        from app.ticket import TicketService
+
+        return TicketService(self)
+
+    @cached_property
+    def uplink(self) -> MessageUplink:
+        from app.stream import MessageUplink
+
+        return MessageUplink(self)
+
+    async def aclose(self):
+        # only close what this session has used
+        opened = vars(self)
+        if "uplink" in opened:
+            await self.uplink.aclose()
+        if "tokens" in opened:
+            await self.tokens.aclose()
+        if "pool" in opened and self._shared_pool is None:
+            await self.pool.aclose()
+        await self.resources.aclose()
+        if self.recorder is not None:
+            self.recorder.close()
+        self.cache.clear()
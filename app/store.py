@@ -0,0 +1,189 @@
+import queue
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, List
+
+from app.base import DATA_DIR
+from app.user import ThreadID, ThreadMessage, UserID
+
+
+class MessageStore:
+    """On-disk message history for one user, one SQLite file per user.
+
+    The same file holds the outbox, the messages typed but not yet sent, so
+    they outlive a dropped connection or a restart.
+
+    Received messages are written with `save_later` from a writer thread with
+    its own connection, so a burst never waits on the disk on the event loop.
+    The file is in WAL mode, where readers do not block on that writer.
+    """
+
+    OUTBOX_PREFIX = "outbox-"
+
+    DATA_DIR = DATA_DIR
+
+    def __init__(self, user_id: UserID, path: str | Path | None = None) -> None:
+        if path is None:
+            self.DATA_DIR.mkdir(parents=True, exist_ok=True)
+            filename = re.sub(r"[^\w.-]", "_", user_id)
+            path = self.DATA_DIR / f"{filename}.sqlite3"
+        self.path = path
+        self.conn = self._connect(path)
+        self._writes: queue.Queue[tuple[ThreadID, list[ThreadMessage]] | None] = (
+            queue.Queue()
+        )
+        self._writer: threading.Thread | None = None
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                id TEXT PRIMARY KEY,
+                thread_id TEXT NOT NULL,
+                time REAL NOT NULL,
+                user_id TEXT NOT NULL,
+                message TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_thread_time
+                ON messages (thread_id, time);
+            CREATE TABLE IF NOT EXISTS outbox (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                thread_id TEXT NOT NULL,
+                time REAL NOT NULL,
+                user_id TEXT NOT NULL,
+                message TEXT NOT NULL
+            );
+            """
+        )
+
+    @staticmethod
+    def _connect(path: str | Path) -> sqlite3.Connection:
+        conn = sqlite3.connect(path)
+        # a commit no longer waits for fsync, at worst the last ones are lost
+        # on power failure, and the server still has those messages
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def save(self, thread_id: ThreadID, msgs: Iterable[ThreadMessage]):
+        with self.conn:
+            self._insert(self.conn, thread_id, msgs)
+
+    def save_later(self, thread_id: ThreadID, msgs: Iterable[ThreadMessage]):
+        """Queue `msgs` for the writer thread, and return at once."""
+        if self._writer is None:
+            self._writer = threading.Thread(
+                target=self._write, name="message-store-writer", daemon=True
+            )
+            self._writer.start()
+        self._writes.put((thread_id, list(msgs)))
+
+    def _write(self):
+        conn = self._connect(self.path)
+        try:
+            closing = False
+            while not closing:
+                batch = [self._writes.get()]
+                while not self._writes.empty():
+                    batch.append(self._writes.get_nowait())
+                # everything queued meanwhile goes in one transaction
+                with conn:
+                    for item in batch:
+                        if item is None:
+                            closing = True
+                        else:
+                            self._insert(conn, *item)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _insert(
+        conn: sqlite3.Connection, thread_id: ThreadID, msgs: Iterable[ThreadMessage]
+    ):
+        conn.executemany(
+            "INSERT OR IGNORE INTO messages VALUES (?, ?, ?, ?, ?)",
+            ((msg.id, thread_id, msg.time, msg.user_id, msg.message) for msg in msgs),
+        )
+
+    def latest(self, thread_id: ThreadID, limit: int) -> List[ThreadMessage]:
+        """Return the newest `limit` messages of a thread, oldest first."""
+        rows = self.conn.execute(
+            "SELECT id, time, user_id, message FROM messages"
+            " WHERE thread_id = ? ORDER BY time DESC LIMIT ?",
+            (thread_id, limit),
+        ).fetchall()
+        return self._to_messages(thread_id, rows)
+
+    def before(
+        self, thread_id: ThreadID, time: float, limit: int
+    ) -> List[ThreadMessage]:
+        """Return up to `limit` messages older than `time`, oldest first."""
+        rows = self.conn.execute(
+            "SELECT id, time, user_id, message FROM messages"
+            " WHERE thread_id = ? AND time < ? ORDER BY time DESC LIMIT ?",
+            (thread_id, time, limit),
+        ).fetchall()
+        return self._to_messages(thread_id, rows)
+
+    def enqueue(
+        self, thread_id: ThreadID, user_id: UserID, text: str, time: float
+    ) -> ThreadMessage:
+        """Queue a message to send, with an id that is only valid locally."""
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO outbox (thread_id, time, user_id, message)"
+                " VALUES (?, ?, ?, ?)",
+                (thread_id, time, user_id, text),
+            )
+        return ThreadMessage(
+            id=f"{self.OUTBOX_PREFIX}{cursor.lastrowid}",
+            time=time,
+            user_id=user_id,
+            message=text,
+            thread_id=thread_id,
+        )
+
+    def queued(
+        self, thread_id: ThreadID | None = None, limit: int = -1
+    ) -> List[ThreadMessage]:
+        """Return the queued messages, of one thread or all, oldest first."""
+        where, params = ("WHERE thread_id = ?", (thread_id,)) if thread_id else ("", ())
+        rows = self.conn.execute(
+            "SELECT seq, thread_id, time, user_id, message FROM outbox"
+            f" {where} ORDER BY seq LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return [
+            ThreadMessage(
+                id=f"{self.OUTBOX_PREFIX}{seq}",
+                time=t,
+                user_id=uid,
+                message=text,
+                thread_id=tid,
+            )
+            for seq, tid, t, uid, text in rows
+        ]
+
+    def dequeue(self, msg: ThreadMessage):
+        seq = int(msg.id.removeprefix(self.OUTBOX_PREFIX))
+        with self.conn:
+            self.conn.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+
+    def discard_queued(self, thread_id: ThreadID):
+        with self.conn:
+            self.conn.execute("DELETE FROM outbox WHERE thread_id = ?", (thread_id,))
+
+    def close(self):
+        """Finish the queued writes and close the file."""
+        if self._writer is not None:
+            self._writes.put(None)
+            self._writer.join()
+            self._writer = None
+        self.conn.close()
+
+    @staticmethod
+    def _to_messages(thread_id: ThreadID, rows: list) -> List[ThreadMessage]:
+        return [
+            ThreadMessage(id=id, time=t, user_id=uid, message=text, thread_id=thread_id)
+            for id, t, uid, text in reversed(rows)
+        ]
@@ -0,0 +1,508 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import (
+    TYPE_CHECKING,
+    AsyncGenerator,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    TypeVar,
+)
+
+import websockets
+from textual import log
+
+from app import exceptions
+from app.backoff import Backoff
+from app.base import Service
+from app.resources import SOCKET
+from app.session import Session
+from app.user import ThreadID, ThreadMessage
+
+if TYPE_CHECKING:
+    from app.store import MessageStore
+
+T = TypeVar("T")
+Outgoing = tuple[dict, asyncio.Future]
+
+
+class MessageUplink(Service):
+    """Long-lived `/messages/up` connection shared by a session's chat screens.
+
+    Messages are queued and written in order over one socket. `send` resolves
+    once the frame has been written, and the connection is re-established with
+    backoff whenever it drops.
+    """
+
+    SEND_TIMEOUT = 10.0
+
+    def __init__(self, session: Session) -> None:
+        super().__init__(session)
+        self._queue: asyncio.Queue[Outgoing] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._backoff = Backoff()
+
+    @property
+    def connected(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def connect(self):
+        """Open the socket now rather than on the first `send`."""
+        if not self.connected:
+            self._task = self.session.resources.spawn(self._run(), "uplink")
+
+    async def send(self, thread_id: str, text: str, timeout: float | None = None):
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(({"tid": thread_id, "text": text}, future))
+        self.connect()
+        metrics = self.session.metrics
+        with metrics.timer("stream_send_seconds", stream="messages_up"):
+            try:
+                await asyncio.wait_for(future, timeout or self.SEND_TIMEOUT)
+            except asyncio.TimeoutError as e:
+                raise exceptions.NetworkError from e
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(exceptions.NetworkError())
+
+    async def _run(self):
+        pending: Outgoing | None = None
+        while True:
+            try:
+                token = await self.session.tokens.get_token()
+                async with self.session.resources.track(
+                    SOCKET,
+                    websockets.connect(
+                        uri=f"{self.WS_BASE_URL}/messages/up",
+                        extra_headers={"Authorization": f"Bearer {token}"},
+                    ),
+                ) as ws:
+                    self.session.metrics.inc(
+                        "stream_connects_total", stream="messages_up"
+                    )
+                    self._backoff.reset()
+                    pong = asyncio.create_task(self._answer_ping(ws))
+                    try:
+                        while True:
+                            if pending is None:
+                                pending = await self._queue.get()
+                            payload, future = pending
+                            if not future.done():
+                                await ws.send(json.dumps(payload))
+                                future.set_result(None)
+                                self.session.metrics.inc(
+                                    "stream_frames_total", stream="messages_up"
+                                )
+                            pending = None
+                    finally:
+                        pong.cancel()
+            except (websockets.WebSocketException, OSError, exceptions.APIError):
+                self.session.metrics.inc(
+                    "stream_disconnects_total", stream="messages_up"
+                )
+                await asyncio.sleep(self._backoff.next())
+
+    async def _answer_ping(self, ws: websockets.WebSocketClientProtocol):
+        try:
+            async for frame in ws:
+                if frame == "PING":
+                    await ws.send("PONG")
+        except websockets.ConnectionClosed:
+            pass
+
+
+class Outbox:
+    """Sends the messages queued in a `MessageStore` over the uplink.
+
+    Messages are written to the store before they are sent, and only removed
+    once the server's echo of them comes back on the downlink, see `confirm`.
+    A dropped link or a restart therefore loses none, and one may be sent
+    twice. They go out in the order they were queued, at most `RATE` per
+    second. A failed send, or a message not echoed within `ECHO_TIMEOUT`
+    seconds, is reported and retried with backoff, holding back the ones
+    behind it.
+    """
+
+    RATE = 5.0
+    RETRY_BASE = 0.5
+    RETRY_CAP = 30.0
+    ECHO_TIMEOUT = 10.0
+
+    def __init__(
+        self,
+        session: Session,
+        store: MessageStore,
+        on_result: Callable[[ThreadMessage, bool], None] | None = None,
+    ) -> None:
+        self.session = session
+        self.store = store
+        self.on_result = on_result
+        self._queued = asyncio.Event()
+        self._retry = asyncio.Event()
+        self._backoff = Backoff(base=self.RETRY_BASE, cap=self.RETRY_CAP)
+        self._last_sent = 0.0
+        # written by the uplink and not echoed yet, the ones still in time are
+        # not sent again
+        self._written: dict[str, ThreadMessage] = {}
+        self._deadlines: dict[str, float] = {}
+
+    def put(self, thread_id: ThreadID, user_id: str, text: str) -> ThreadMessage:
+        msg = self.store.enqueue(thread_id, user_id, text, time.time())
+        self._queued.set()
+        return msg
+
+    def retry(self):
+        """Send the held back messages now rather than after the backoff."""
+        self._backoff.reset()
+        self._retry.set()
+
+    def discard(self, thread_id: ThreadID):
+        """Drop the queued messages of a thread that no longer exists."""
+        self.store.discard_queued(thread_id)
+        for msg in list(self._written.values()):
+            if msg.thread_id == thread_id:
+                del self._written[msg.id]
+                self._deadlines.pop(msg.id, None)
+
+    def confirm(self, received: ThreadMessage) -> ThreadMessage | None:
+        """Remove the queued message `received` is the echo of, and return it.
+
+        The server assigns its own ids, so the echo is matched by thread,
+        sender and text, against the messages the uplink has written, oldest
+        first. Only those can have an echo, which avoids comparing the
+        server's clock with ours.
+        """
+        for msg in self._written.values():
+            if (msg.thread_id, msg.user_id, msg.message) == (
+                received.thread_id,
+                received.user_id,
+                received.message,
+            ):
+                del self._written[msg.id]
+                self._deadlines.pop(msg.id, None)
+                self.store.dequeue(msg)
+                return msg
+        return None
+
+    async def run(self):
+        while True:
+            now = time.monotonic()
+            expired = [i for i, deadline in self._deadlines.items() if deadline <= now]
+            if expired:
+                for msg_id in expired:
+                    del self._deadlines[msg_id]
+                    self._report(self._written[msg_id], False)
+                self._retry.clear()
+                await self._hold()
+                continue
+            msg = self._next()
+            if msg is None:
+                self._queued.clear()
+                # wake up for new messages, or when the next echo is overdue
+                deadline = min(self._deadlines.values(), default=None)
+                try:
+                    await asyncio.wait_for(
+                        self._queued.wait(), deadline and deadline - now
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await asyncio.sleep(self._last_sent + 1 / self.RATE - time.monotonic())
+            self._retry.clear()
+            try:
+                await self.session.uplink.send(msg.thread_id, msg.message)  # type: ignore
+            except exceptions.APIError:
+                self._report(msg, False)
+                await self._hold()
+                continue
+            self._last_sent = time.monotonic()
+            self._backoff.reset()
+            self._written[msg.id] = msg
+            self._deadlines[msg.id] = self._last_sent + self.ECHO_TIMEOUT
+            self._report(msg, True)
+
+    def _next(self) -> ThreadMessage | None:
+        """The oldest queued message that is not waiting for its echo."""
+        for msg in self.store.queued(limit=len(self._deadlines) + 1):
+            if msg.id not in self._deadlines:
+                return msg
+        return None
+
+    async def _hold(self):
+        try:
+            await asyncio.wait_for(self._retry.wait(), self._backoff.next())
+        except asyncio.TimeoutError:
+            pass
+
+    def _report(self, msg: ThreadMessage, sent: bool):
+        if self.on_result is not None:
+            self.on_result(msg, sent)
+
+
+class MessageDownlink:
+    """Resumable `/messages/down` subscription.
+
+    Reconnects with backoff whenever the socket drops, resubscribing from the
+    newest message time seen per thread, and drops frames whose id has already
+    been delivered.
+    """
+
+    SEEN_LIMIT = 2048
+
+    def __init__(
+        self,
+        session: Session,
+        offset: dict[ThreadID, float],
+        seen: Iterable[str] = (),
+        on_state: Callable[[bool], None] | None = None,
+    ) -> None:
+        self.session = session
+        self.offset = dict(offset)
+        self.on_state = on_state
+        self.connected = True
+        self._seen: OrderedDict[str, None] = OrderedDict.fromkeys(seen)
+        self._backoff = Backoff()
+
+    @property
+    def seen_ids(self) -> list[str]:
+        return list(self._seen)
+
+    def seen(self, msg: ThreadMessage) -> bool:
+        if msg.id in self._seen:
+            return True
+        self._seen[msg.id] = None
+        if len(self._seen) > self.SEEN_LIMIT:
+            self._seen.popitem(last=False)
+        return False
+
+    async def __aiter__(self) -> AsyncGenerator[ThreadMessage, None]:
+        while True:
+            try:
+                async for msg in self.session.threads.iterate_new(
+                    self.offset, on_open=self._on_open
+                ):
+                    self._advance(msg)
+                    if not self.seen(msg):
+                        yield msg
+            except exceptions.APIError:
+                pass
+            self.session.metrics.inc("stream_disconnects_total", stream="messages_down")
+            self._set_connected(False)
+            await asyncio.sleep(self._backoff.next())
+
+    def _on_open(self):
+        self._backoff.reset()
+        self._set_connected(True)
+
+    def _advance(self, msg: ThreadMessage):
+        thread_id = msg.thread_id
+        if thread_id is None and len(self.offset) == 1:
+            thread_id = msg.thread_id = next(iter(self.offset))
+        if thread_id is not None:
+            self.offset[thread_id] = max(self.offset.get(thread_id, 0), msg.time)
+
+    def _set_connected(self, connected: bool):
+        if connected != self.connected:
+            self.connected = connected
+            if self.on_state is not None:
+                self.on_state(connected)
+
+
+async def coalesce(
+    source: AsyncIterable[T], interval: float, max_size: int = 1000
+) -> AsyncIterator[list[T]]:
+    """Group items from `source` into batches.
+
+    A batch is flushed `interval` seconds after its first item arrived, so no
+    item waits longer than that, and bursts are delivered together.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    end = object()
+    error: Exception | None = None
+
+    async def pump():
+        nonlocal error
+        try:
+            async for item in source:
+                queue.put_nowait(item)
+        except Exception as e:
+            error = e
+        queue.put_nowait(end)
+
+    task = asyncio.create_task(pump())
+    try:
+        finished = False
+        while not finished:
+            batch = []
+            item = await queue.get()
+            await asyncio.sleep(interval)
+            while True:
+                if item is end:
+                    finished = True
+                    break
+                batch.append(item)
+                if len(batch) >= max_size or queue.empty():
+                    break
+                item = queue.get_nowait()
+            if batch:
+                yield batch
+        if error is not None:
+            raise error
+    finally:
+        task.cancel()
+
+
+class OffsetCommitter:
+    """Coalesce read-offset updates into periodic commits.
+
+    `mark` only records the newest handled offset; it is written every
+    `interval` seconds and on `aclose`. Offsets are marked after handling, so
+    a crash replays at most one interval of notifications instead of losing
+    any.
+    """
+
+    INTERVAL = 2.0
+
+    def __init__(
+        self,
+        commit: Callable[[float], Awaitable[None]],
+        interval: float | None = None,
+    ) -> None:
+        self.commit = commit
+        self.interval = interval or self.INTERVAL
+        self.pending: float | None = None
+        self.committed: float | None = None
+        self._task: asyncio.Task | None = None
+
+    def mark(self, offset: float):
+        if self.pending is None or offset > self.pending:
+            self.pending = offset
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        offset = self.pending
+        if offset is None or offset == self.committed:
+            return
+        await self.commit(offset)
+        self.committed = offset
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except exceptions.APIError:
+            pass
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.interval)
+        try:
+            await self.flush()
+        except exceptions.APIError:
+            pass
+        if self.pending != self.committed:
+            self._task = asyncio.create_task(self._flush_later())
+
+
+Handler = Callable[[dict], None]
+
+
+class NotificationHub:
+    """The session's one notification stream, fanned out to subscribers.
+
+    The read offset is fetched once, the stream resumes from the newest
+    notification handled whenever it drops, and handled offsets are committed
+    through an `OffsetCommitter`. Subscribers match a notification by its code,
+    a shell-style pattern such as `thread_*`, and by the values in its details.
+    """
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+        self.offset: float | None = None
+        self._handlers: list[tuple[str, dict, Handler]] = []
+        self._committer = OffsetCommitter(session.notifications.update_last_read_offset)
+        self._task: asyncio.Task | None = None
+        self._backoff = Backoff()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = self.session.resources.spawn(self._run(), "notifications")
+
+    def subscribe(
+        self, handler: Handler, code: str = "*", **details
+    ) -> Callable[[], None]:
+        """Call `handler` with every matching notification until unsubscribed."""
+        entry = (code, details, handler)
+        self._handlers.append(entry)
+
+        def unsubscribe():
+            if entry in self._handlers:
+                self._handlers.remove(entry)
+
+        return unsubscribe
+
+    def dispatch(self, notification: dict):
+        code = notification.get("code", "")
+        details = notification.get("details") or {}
+        for pattern, wanted, handler in list(self._handlers):
+            if not fnmatchcase(code, pattern):
+                continue
+            if any(details.get(k) != v for k, v in wanted.items()):
+                continue
+            try:
+                handler(notification)
+            except Exception as e:
+                self.session.metrics.inc(
+                    "notification_handler_errors_total",
+                    code=code,
+                    error=type(e).__name__,
+                )
+
+    async def aclose(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._committer.aclose()
+        self._handlers.clear()
+
+    async def _run(self):
+        notifications = self.session.notifications
+        while True:
+            try:
+                if self.offset is None:
+                    self.offset = await notifications.get_last_read_offset()
+                async for n in notifications.iterate(self.offset):
+                    self._backoff.reset()
+                    self.dispatch(n)
+                    self.offset = max(self.offset, n["time"])
+                    self._committer.mark(n["time"])
+            except exceptions.APIError:
+                pass
+            except Exception as e:
+                # a bug here must not end the one stream every screen shares
+                log.error(f"notification stream failed: {e!r}")
+                self.session.metrics.inc(
+                    "stream_errors_total",
+                    stream="notifications",
+                    error=type(e).__name__,
+                )
+            self.session.metrics.inc("stream_disconnects_total", stream="notifications")
+            await asyncio.sleep(self._backoff.next())
@@ -4,8 +4,9 @@ from typing import List, TypeAlias
 import httpx
 
 from app import exceptions
-from app.auth import JWTAuth
-from app.base import Service
+from app.base import Service, instrumented
+from app.cache import Namespace
+from app.resources import STREAM
 
 ThreadID: TypeAlias = str
 
@@ -17,41 +18,53 @@ class Ticket:
 
 
 class TicketService(Service):
-    @classmethod
-    async def get_tickets(cls) -> List[Ticket]:
-        async with httpx.AsyncClient(base_url=cls.BASE_URL, auth=JWTAuth()) as client:
-            try:
-                resp = await client.get("/tickets")
-            except httpx.HTTPError as e:
-                raise exceptions.NetworkError from e
+    TICKETS_TTL = 5.0
+
+    @property
+    def tickets_cache(self) -> Namespace:
+        return self.session.cache.namespace("tickets")
+
+    async def get_tickets(self) -> List[Ticket]:
+        return await self.tickets_cache.get_or_compute(
+            self.cache_key(), self._get_tickets, ttl=self.TICKETS_TTL
+        )
+
+    @instrumented("tickets.get_tickets")
+    async def _get_tickets(self) -> List[Ticket]:
+        try:
+            resp = await self.client().get("/tickets", auth=self.auth)
+        except httpx.HTTPError as e:
+            raise exceptions.NetworkError from e
         if resp.status_code != httpx.codes.OK:
             raise exceptions.APIError(str(resp.status_code))
         return [Ticket(id=i["id"], thread_id=i["thread_id"]) for i in resp.json()]
 
-    @classmethod
-    async def delete_ticket(cls, ticket_id: str):
-        async with httpx.AsyncClient(base_url=cls.BASE_URL, auth=JWTAuth()) as client:
-            try:
-                resp = await client.delete(f"/tickets/{ticket_id}")
-            except httpx.HTTPError as e:
-                raise exceptions.NetworkError from e
+    @instrumented("tickets.delete_ticket")
+    async def delete_ticket(self, ticket_id: str):
+        self.tickets_cache.delete(self.cache_key())
+        try:
+            resp = await self.client().delete(f"/tickets/{ticket_id}", auth=self.auth)
+        except httpx.HTTPError as e:
+            raise exceptions.NetworkError from e
         if resp.status_code != httpx.codes.NO_CONTENT:
             raise exceptions.APIError(str(resp.status_code))
 
-    @classmethod
-    async def wait_matching_result(cls, ticket_id: str) -> ThreadID:
+    @instrumented("tickets.wait_matching_result")
+    async def wait_matching_result(self, ticket_id: str) -> ThreadID:
         thread_id = None
-        async with httpx.AsyncClient(base_url=cls.BASE_URL, auth=JWTAuth()) as client:
-            try:
-                async with client.stream(
-                    "GET", f"/match/tickets/{ticket_id}", timeout=None
-                ) as resp:
-                    async for thread_id in resp.aiter_lines():
-                        thread_id = thread_id
-            except httpx.HTTPError as e:
-                raise exceptions.NetworkError from e
+        try:
+            async with self.session.resources.track(
+                STREAM,
+                self.client().stream(
+                    "GET", f"/match/tickets/{ticket_id}", auth=self.auth, timeout=None
+                ),
+            ) as resp:
+                async for thread_id in resp.aiter_lines():
+                    thread_id = thread_id
+        except httpx.HTTPError as e:
+            raise exceptions.NetworkError from e
         if resp.status_code == httpx.codes.FORBIDDEN:
-            raise exceptions.APIError("wrong ticket")
+            raise exceptions.WrongTicket
         elif resp.status_code == 524:
             raise TimeoutError(str(resp.text))
         elif resp.status_code != httpx.codes.OK:
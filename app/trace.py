@@ -0,0 +1,335 @@
+"""Record the traffic of a session and replay it into the app.
+
+With `TRACE_FILE` set, the app writes every HTTP response, stream chunk and
+`/messages/down` frame it receives to that file, one JSON event per line with
+its time since start. Secrets and tokens are left out.
+
+A trace is replayed by a `ReplayServer`, which answers the app's requests with
+the recorded responses at the recorded times, optionally compressed. The
+replay drives a headless `RandomChatApp` through `run_test` and reports the
+render latency of each message batch and the memory used.
+
+    TRACE_FILE=session.jsonl python -m app.app
+    python -m app.trace session.jsonl --speed 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import codecs
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from dataclasses import dataclass, field
+from itertools import count
+from pathlib import Path
+from typing import AsyncIterator
+
+import httpx
+import jwt
+from dotenv import load_dotenv
+
+from app.fake_server import SIGNING_KEY, FakeServer, Request, Response, WebSocket
+from app.metrics import Histogram
+
+# responses that carry a secret or a token are recorded without their body
+REDACTED = {("POST", "/users"), ("POST", "/tokens")}
+
+
+class TraceRecorder:
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.file = open(self.path, "w", buffering=1)
+        self.started = time.monotonic()
+        self._ids = count()
+
+    def record(self, kind: str, **fields) -> int:
+        """Append an event and return its id."""
+        id = next(self._ids)
+        if not self.file.closed:
+            t = round(time.monotonic() - self.started, 6)
+            self.file.write(json.dumps({"id": id, "t": t, "kind": kind, **fields}))
+            self.file.write("\n")
+        return id
+
+    def close(self):
+        self.file.close()
+
+
+class RecordingTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, recorder: TraceRecorder, **kwargs) -> None:
+        self.recorder = recorder
+        super().__init__(**kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await super().handle_async_request(request)
+        key = (request.method, request.url.path)
+        response_id = self.recorder.record(
+            "response",
+            method=request.method,
+            path=request.url.path,
+            status=response.status_code,
+            chunked=response.headers.get("transfer-encoding") == "chunked",
+            redacted=key in REDACTED,
+        )
+        if key not in REDACTED:
+            # the async transport only ever hands back async streams
+            assert isinstance(response.stream, httpx.AsyncByteStream)
+            response.stream = RecordingStream(
+                response.stream, self.recorder, response_id
+            )
+        return response
+
+
+class RecordingStream(httpx.AsyncByteStream):
+    def __init__(
+        self, stream: httpx.AsyncByteStream, recorder: TraceRecorder, response_id: int
+    ) -> None:
+        self.stream = stream
+        self.recorder = recorder
+        self.response_id = response_id
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            if data := self._decoder.decode(chunk):
+                self.recorder.record("chunk", response=self.response_id, data=data)
+            yield chunk
+        self.recorder.record("end", response=self.response_id)
+
+    async def aclose(self):
+        await self.stream.aclose()
+
+
+def load(path: str | Path) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ReplayServer(FakeServer):
+    """Serves a recorded trace, `speed` times faster than it was recorded.
+
+    Responses are matched by method and path in recorded order, and the last
+    one is repeated once they run out. Requests the trace never saw fall back
+    to the fake server, and tokens are minted for the recorded user.
+    """
+
+    def __init__(self, events: list[dict], speed: float = 1.0, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.speed = speed
+        self.user_id = next(
+            (e["user_id"] for e in events if e["kind"] == "login"), "replay"
+        )
+        self.responses: dict[tuple[str, str], deque[dict]] = {}
+        self.last: dict[tuple[str, str], dict] = {}
+        self.chunks: dict[int, list[dict]] = {}
+        self.ended: set[int] = set()
+        self.frames = [e for e in events if e["kind"] == "frame"]
+        self.duration = max((e["t"] for e in events), default=0.0)
+        self.sent = 0
+        self.done = asyncio.Event()
+        for event in events:
+            if event["kind"] == "response":
+                key = (event["method"], event["path"])
+                self.responses.setdefault(key, deque()).append(event)
+            elif event["kind"] == "chunk":
+                self.chunks.setdefault(event["response"], []).append(event)
+            elif event["kind"] == "end":
+                self.ended.add(event["response"])
+        if not self.frames:
+            self.done.set()
+
+    async def start(self):
+        await super().start()
+        self.started = time.monotonic()
+
+    async def _at(self, t: float):
+        await asyncio.sleep(self.started + t / self.speed - time.monotonic())
+
+    async def _dispatch(self, request: Request) -> Response:
+        key = (request.method, request.path)
+        if key == ("POST", "/tokens"):
+            exp = time.time() + self.token_ttl
+            token = jwt.encode({"id": self.user_id, "exp": exp}, SIGNING_KEY)
+            return Response(200, {"access_token": token})
+        queue = self.responses.get(key)
+        if queue:
+            self.last[key] = queue.popleft()
+        recorded = self.last.get(key)
+        if recorded is None or recorded["redacted"]:
+            return await super()._dispatch(request)
+        chunks = self.chunks.get(recorded["id"], [])
+        if recorded["chunked"]:
+            return Response(recorded["status"], stream=self._stream(recorded, chunks))
+        return Response(recorded["status"], text="".join(c["data"] for c in chunks))
+
+    async def _stream(self, recorded: dict, chunks: list[dict]) -> AsyncIterator[bytes]:
+        for chunk in chunks:
+            await self._at(chunk["t"])
+            yield chunk["data"].encode()
+        if recorded["id"] not in self.ended:
+            # the stream was still open when the recording stopped
+            await asyncio.Event().wait()
+
+    async def messages_down(self, ws: WebSocket, user_id: str):
+        if await ws.recv() is None:
+            return
+        closed = asyncio.ensure_future(self._until_closed(ws))
+        try:
+            while self.sent < len(self.frames) and not closed.done():
+                frame = self.frames[self.sent]
+                await self._at(frame["t"])
+                await ws.send(frame["data"])
+                self.sent += 1
+            self.done.set()
+            await closed
+        finally:
+            closed.cancel()
+
+
+@dataclass
+class ReplayReport:
+    speed: float
+    duration: float
+    frames: int
+    sent: int = 0
+    rendered: int = 0
+    batches: Histogram = field(default_factory=Histogram)
+    lines: Histogram = field(default_factory=Histogram)
+    memory_current: int = 0
+    memory_peak: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "speed": self.speed,
+            "duration": self.duration,
+            "frames": self.frames,
+            "sent": self.sent,
+            "rendered": self.rendered,
+            "batch_render": self.batches.summary(),
+            "line_render": self.lines.summary(),
+            "memory_current": self.memory_current,
+            "memory_peak": self.memory_peak,
+        }
+
+    def render(self) -> str:
+        lines = [
+            f"replayed {self.sent}/{self.frames} frames at {self.speed:g}x "
+            f"in {self.duration:.1f}s, {self.rendered} messages on screen",
+            f"memory {self.memory_current / 2**20:.1f} MiB, "
+            f"peak {self.memory_peak / 2**20:.1f} MiB",
+        ]
+        for name, histogram in (("batch", self.batches), ("viewport", self.lines)):
+            s = histogram.summary()
+            lines.append(
+                f"{name} render: n={s['count']} p50={s['p50'] * 1000:.1f}ms "
+                f"p90={s['p90'] * 1000:.1f}ms p99={s['p99'] * 1000:.1f}ms "
+                f"max={s['max'] * 1000:.1f}ms"
+            )
+        return "\n".join(lines)
+
+
+SETTLE_TIMEOUT = 10.0
+
+
+async def replay(
+    path: str | Path,
+    speed: float = 1.0,
+    size: tuple[int, int] = (120, 40),
+    memory: bool = True,
+) -> ReplayReport:
+    """Replay a trace into a headless app and report how it rendered."""
+    from app.app import RandomChatApp
+    from app.auth import TokenManager
+    from app.base import Service
+    from app.store import MessageStore
+    from app.widgets.chat import ChatScreen
+
+    events = load(path)
+    saved = (
+        Service.BASE_URL,
+        Service.WS_BASE_URL,
+        MessageStore.DATA_DIR,
+        TokenManager.PERSIST,
+    )
+    if memory:
+        tracemalloc.start()
+    try:
+        with tempfile.TemporaryDirectory() as data_dir:
+            # start from an empty store, and leave the real one alone
+            MessageStore.DATA_DIR = Path(data_dir)
+            TokenManager.PERSIST = False
+            async with ReplayServer(events, speed) as server:
+                Service.BASE_URL = f"http://{server.domain}"
+                Service.WS_BASE_URL = f"ws://{server.domain}"
+                report = ReplayReport(speed, 0.0, len(server.frames))
+                app = RandomChatApp()
+                async with app.run_test(size=size) as pilot:
+                    await pilot.press(*"replay", "enter")
+                    timeout = server.duration / speed + SETTLE_TIMEOUT
+                    try:
+                        await asyncio.wait_for(server.done.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    await pilot.pause(ChatScreen.FLUSH_INTERVAL * 2)
+                    await pilot.pause()
+                    screen = app.screen
+                    if isinstance(screen, ChatScreen):
+                        report.rendered = sum(
+                            len(thread.messages) for thread in screen.threads.values()
+                        )
+                report.duration = time.monotonic() - server.started
+                report.sent = server.sent
+        metrics = app.session.metrics
+        report.batches = metrics.histogram(
+            "render_seconds", widget="thread", stage="append"
+        )
+        report.lines = metrics.histogram(
+            "render_seconds", widget="thread", stage="lines"
+        )
+        if memory:
+            report.memory_current, report.memory_peak = tracemalloc.get_traced_memory()
+    finally:
+        if memory:
+            tracemalloc.stop()
+        (
+            Service.BASE_URL,
+            Service.WS_BASE_URL,
+            MessageStore.DATA_DIR,
+            TokenManager.PERSIST,
+        ) = saved
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    # before replay() first imports the services, which read their settings
+    load_dotenv()
+    parser = argparse.ArgumentParser(prog="python -m app.trace")
+    parser.add_argument("trace", help="a file recorded with TRACE_FILE")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="time compression, e.g. 10"
+    )
+    parser.add_argument("--width", type=int, default=120)
+    parser.add_argument("--height", type=int, default=40)
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc")
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(
+        replay(
+            args.trace,
+            args.speed,
+            size=(args.width, args.height),
+            memory=not args.no_memory,
+        )
+    )
+    print(json.dumps(report.to_dict(), indent=2) if args.json else report.render())
+    return 0 if report.sent == report.frames else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,15 @@
 import json
 from dataclasses import dataclass
-from typing import AsyncIterator, List, TypeAlias
+from typing import AsyncGenerator, AsyncIterator, Callable, List, TypeAlias
 
 import httpx
 import websockets
 
 from app import exceptions
-from app.auth import JWTAuth
-from app.base import Service
+from app.base import Service, instrumented
+from app.cache import Namespace
+from app.framing import JSONFramer
+from app.resources import SOCKET, STREAM
 
 UserID: TypeAlias = str
 ThreadID: TypeAlias = str
@@ -17,35 +19,44 @@ NotificationID: TypeAlias = str
 
 
 class UserService(Service):
-    @classmethod
-    async def create(cls) -> Secret:
-        async with httpx.AsyncClient(base_url=cls.BASE_URL) as client:
-            try:
-                resp = await client.post("/users")
-            except httpx.HTTPError as e:
-                raise exceptions.NetworkError from e
+    THREADS_TTL = 10.0
+
+    @property
+    def threads_cache(self) -> Namespace:
+        return self.session.cache.namespace("threads")
+
+    @instrumented("users.create")
+    async def create(self) -> Secret:
+        try:
+            resp = await self.client().post("/users")
+        except httpx.HTTPError as e:
+            raise exceptions.NetworkError from e
         if resp.status_code != httpx.codes.CREATED:
             raise exceptions.ServiceError
         return resp.json()["secret"]
 
-    @classmethod
-    async def fetch_thread_ids(cls) -> List[ThreadID]:
-        async with httpx.AsyncClient(base_url=cls.BASE_URL, auth=JWTAuth()) as client:
-            try:
-                resp = await client.get("/threads")
-            except httpx.HTTPError as e:
-                raise exceptions.NetworkError from e
+    async def fetch_thread_ids(self) -> List[ThreadID]:
+        return await self.threads_cache.get_or_compute(
+            self.cache_key(), self._fetch_thread_ids, ttl=self.THREADS_TTL
+        )
+
+    @instrumented("users.fetch_thread_ids")
+    async def _fetch_thread_ids(self) -> List[ThreadID]:
+        try:
+            resp = await self.client().get("/threads", auth=self.auth)
+        except httpx.HTTPError as e:
+            raise exceptions.NetworkError from e
         if resp.status_code != httpx.codes.OK:
             raise exceptions.APIError(resp.text)
         return resp.json()["ids"]
 
-    @classmethod
-    async def start_matching(cls) -> TicketID:
-        async with httpx.AsyncClient(base_url=cls.BASE_URL, auth=JWTAuth()) as client:
-            try:
-                resp = await client.post("/match")
-            except httpx.HTTPError as e:
-                raise exceptions.NetworkError from e
+    @instrumented("users.start_matching")
+    async def start_matching(self) -> TicketID:
+        self.session.tickets.tickets_cache.delete(self.cache_key())
+        try:
+            resp = await self.client().post("/match", auth=self.auth)
+        except httpx.HTTPError as e:
+            raise exceptions.NetworkError from e
         if resp.status_code == httpx.codes.TOO_MANY_REQUESTS:
             raise exceptions.APIError("already in matching")
         elif resp.status_code != httpx.codes.OK:
@@ -54,77 +65,97 @@ class UserService(Service):
 
 
 class NotificationService(Service):
-    @classmethod
-    async def get_last_read_offset(cls) -> float:
-        async with httpx.AsyncClient(base_url=cls.BASE_URL, auth=JWTAuth()) as client:
-            try:
-                resp = await client.get("/users/me/notifications/read-offset")
-            except httpx.HTTPError as e:
-                raise exceptions.NetworkError from e
+    @instrumented("notifications.get_last_read_offset")
+    async def get_last_read_offset(self) -> float:
+        try:
+            resp = await self.client().get(
+                "/users/me/notifications/read-offset", auth=self.auth
+            )
+        except httpx.HTTPError as e:
+            raise exceptions.NetworkError from e
         if resp.status_code != httpx.codes.OK:
             raise exceptions.ServiceError
         else:
             return resp.json()["offset"]
 
-    @classmethod
-    async def update_last_read_offset(cls, timestamp: float):
-        async with httpx.AsyncClient(base_url=cls.BASE_URL, auth=JWTAuth()) as client:
-            try:
-                resp = await client.patch(
-                    "/users/me/notifications/read-offset",
-                    json={"new_offset": int(timestamp * 1000)},
-                )
-            except httpx.HTTPError as e:
-                raise exceptions.NetworkError from e
+    @instrumented("notifications.update_last_read_offset")
+    async def update_last_read_offset(self, timestamp: float):
+        try:
+            resp = await self.client().patch(
+                "/users/me/notifications/read-offset",
+                json={"new_offset": int(timestamp * 1000)},
+                auth=self.auth,
+            )
+        except httpx.HTTPError as e:
+            raise exceptions.NetworkError from e
         if resp.status_code != httpx.codes.OK:
             raise exceptions.APIError(resp.text)
 
-    @classmethod
-    async def iterate(cls, timestamp: float) -> AsyncIterator[dict]:
-        async with httpx.AsyncClient(base_url=cls.BASE_URL, auth=JWTAuth()) as client:
-            try:
-                async with client.stream(
+    async def iterate(self, timestamp: float) -> AsyncGenerator[dict, None]:
+        try:
+            async with self.session.resources.track(
+                STREAM,
+                self.client().stream(
                     "GET",
                     "/users/me/notifications",
                     params={"t": timestamp},
+                    auth=self.auth,
                     timeout=None,
-                ) as resp:
-                    async for i in resp.aiter_text():
-                        yield json.loads(i)
-            except httpx.HTTPError as e:
-                raise exceptions.NetworkError from e
+                ),
+            ) as resp:
+                framer = JSONFramer()
+                async for chunk in resp.aiter_text():
+                    skipped = framer.skipped
+                    notifications = framer.feed(chunk)
+                    if framer.skipped > skipped:
+                        self.session.metrics.inc(
+                            "stream_frame_errors_total",
+                            framer.skipped - skipped,
+                            stream="notifications",
+                        )
+                    for notification in notifications:
+                        self.session.metrics.inc(
+                            "stream_frames_total", stream="notifications"
+                        )
+                        yield notification
+        except httpx.HTTPError as e:
+            raise exceptions.NetworkError from e
 
 
-@dataclass
+@dataclass(slots=True)
 class ThreadMessage:
     id: str
     time: float
     user_id: str
     message: str
+    thread_id: ThreadID | None = None
 
 
 class ThreadService(Service):
-    @classmethod
-    async def leave(cls, thread_id: str):
-        async with httpx.AsyncClient(base_url=cls.BASE_URL, auth=JWTAuth()) as client:
-            try:
-                resp = await client.post(f"/threads/{thread_id}/leave")
-            except httpx.HTTPError as e:
-                raise exceptions.NetworkError from e
+    @instrumented("threads.leave")
+    async def leave(self, thread_id: str):
+        self.session.users.threads_cache.delete(self.cache_key())
+        try:
+            resp = await self.client().post(
+                f"/threads/{thread_id}/leave", auth=self.auth
+            )
+        except httpx.HTTPError as e:
+            raise exceptions.NetworkError from e
         if resp.status_code != httpx.codes.OK:
             raise exceptions.APIError(resp.text)
 
-    @classmethod
+    @instrumented("threads.fetch_old_messages")
     async def fetch_old_messages(
-        cls, thread_id: ThreadID, offset: float
+        self, thread_id: ThreadID, offset: float
     ) -> List[ThreadMessage]:
-        async with httpx.AsyncClient(base_url=cls.BASE_URL, auth=JWTAuth()) as client:
-            try:
-                resp = await client.get(
-                    f"/threads/{thread_id}", params={"t": int(offset * 1000)}
-                )
-            except httpx.HTTPError as e:
-                raise exceptions.NetworkError from e
+        try:
+            resp = await self.client().get(
+                f"/threads/{thread_id}",
+                params={"t": int(offset * 1000)},
+                auth=self.auth,
+            )
+        except httpx.HTTPError as e:
+            raise exceptions.NetworkError from e
         if resp.status_code != httpx.codes.OK:
             raise exceptions.APIError(resp.text)
         return [
@@ -137,52 +168,51 @@ class ThreadService(Service):
             for data in resp.json()["data"]
         ]
 
-    @classmethod
     async def iterate_new(
-        cls, offset: dict[ThreadID, float]
+        self,
+        offset: dict[ThreadID, float],
+        on_open: Callable[[], None] | None = None,
     ) -> AsyncIterator[ThreadMessage]:
-        token = await JWTAuth().async_get_token()
-        async with websockets.connect(
-            uri=f"{cls.WS_BASE_URL}/messages/down",
-            extra_headers={"Authorization": f"Bearer {token}"},
-        ) as ws:
-            try:
+        token = await self.session.tokens.get_token()
+        try:
+            async with self.session.resources.track(
+                SOCKET,
+                websockets.connect(
+                    uri=f"{self.WS_BASE_URL}/messages/down",
+                    extra_headers={"Authorization": f"Bearer {token}"},
+                ),
+            ) as ws:
                 await ws.send(json.dumps(offset))
+                self.session.metrics.inc(
+                    "stream_connects_total", stream="messages_down"
+                )
+                if on_open is not None:
+                    on_open()
                 while frame := await ws.recv():
                     if frame == "PING":
                         await ws.send("PONG")
                     else:
+                        self.session.metrics.inc(
+                            "stream_frames_total", stream="messages_down"
+                        )
+                        if self.session.recorder is not None:
+                            self.session.recorder.record(
+                                "frame", path="/messages/down", data=frame
+                            )
                         data = json.loads(frame)
                         yield ThreadMessage(
                             id=data["id"],
                             user_id=data["uid"],
                             message=data["text"],
                             time=data["time"],
+                            thread_id=data.get("tid"),
                         )
-            except websockets.ConnectionClosed:
-                print("listen fail")
-                print(ws.close_code)
-
-    @classmethod
-    async def send_message(cls, thread_id: str, text: str):
-        token = await JWTAuth().async_get_token()
-        async with websockets.connect(
-            uri=f"{cls.WS_BASE_URL}/messages/up",
-            extra_headers={"Authorization": f"Bearer {token}"},
-        ) as ws:
-            try:
-                print("sending")
-                data = {"tid": thread_id, "text": text}
-                await ws.send(json.dumps(data))
-                await ws.close()
-                await ws.wait_closed()
-            except websockets.ConnectionClosed:
-                print("send fail")
-                print(ws.close_code)
+        except (websockets.WebSocketException, OSError) as e:
+            raise exceptions.NetworkError from e
 
 
 class User:
     def __init__(self, id: UserID, secret: Secret) -> None:
         self.id = id
         self.secret = secret
-        self.thread_id: ThreadID | None = None
+        self.thread_ids: List[ThreadID] = []
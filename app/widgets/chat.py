@@ -2,131 +2,642 @@ from __future__ import annotations
 
 import asyncio
 import time
-from typing import List
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from functools import cached_property
+from itertools import count
+from typing import Callable, Iterable, List
 
+from rich.cells import cell_len
+from rich.segment import Segment
+from rich.text import Text
 from textual import work
 from textual.app import ComposeResult
-from textual.containers import Horizontal, Vertical, VerticalScroll
+from textual.containers import Vertical
+from textual.geometry import Region, Size
 from textual.message import Message
 from textual.screen import Screen
-from textual.widgets import Footer, Header, Input, Static
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+from textual.widgets import Footer, Header, Input, Tab, TabbedContent, TabPane
 
-from app.user import NotificationService, ThreadMessage, ThreadService
+from app import exceptions
+from app.metrics import Metrics
+from app.prefetch import HistoryPrefetch
+from app.session import Session
+from app.store import MessageStore
+from app.stream import MessageDownlink, Outbox, coalesce
+from app.user import ThreadID, ThreadMessage
 
 
-class MessageRow(Horizontal):
-    pass
+class Thread(ScrollView):
+    """Chat history rendered with the line API.
 
+    Messages are kept in a plain list and only the lines inside the viewport
+    are rendered, so the cost of a long conversation does not grow with the
+    number of widgets.
 
-class MessageStatic(Static):
-    pass
+    Messages the user sent are echoed at once in a pending state and kept at
+    the bottom until the server sends them back, and failed ones are marked
+    until they are retried.
+    """
 
+    DEFAULT_CSS = """
+    Thread {
+        overflow-x: hidden;
+    }
+
+    Thread > .thread--pending {
+        text-style: dim;
+    }
+
+    Thread > .thread--failed {
+        color: $error;
+    }
+    """
+
+    COMPONENT_CLASSES = {"thread--pending", "thread--failed"}
+    FAILED_MARK = "✗ "
+
+    MESSAGE_WIDTH = 0.4
+    WRAP_CACHE_SIZE = 512
 
-class Thread(VerticalScroll):
     class NewThreadMessage(Message):
         def __init__(
-            self, thread_msgs: List[ThreadMessage], auto_scroll: bool = True
+            self,
+            thread_msgs: List[ThreadMessage],
+            auto_scroll: bool = True,
+            confirmed: Iterable[str] = (),
         ) -> None:
             self.thread_msgs = thread_msgs
             self.auto_scroll = auto_scroll
+            # ids of the pending messages that `thread_msgs` are the echoes of
+            self.confirmed = confirmed
+            super().__init__()
+
+    class OldThreadMessage(Message):
+        def __init__(self, thread_msgs: List[ThreadMessage]) -> None:
+            self.thread_msgs = thread_msgs
             super().__init__()
 
+    class HistoryRequested(Message):
+        def __init__(self, thread: Thread, before: float) -> None:
+            self.thread = thread
+            self.before = before
+            super().__init__()
+
+        @property
+        def control(self) -> Thread:
+            return self.thread
+
+    class HistoryCancelled(Message):
+        def __init__(self, thread: Thread) -> None:
+            self.thread = thread
+            super().__init__()
+
+        @property
+        def control(self) -> Thread:
+            return self.thread
+
+    def __init__(
+        self,
+        thread_id: ThreadID | None = None,
+        name: str | None = None,
+        id: str | None = None,
+        classes: str | None = None,
+    ) -> None:
+        self.thread_id = thread_id
+        self.messages: list[ThreadMessage] = []
+        self.pending: dict[str, ThreadMessage] = {}
+        self.failed: set[str] = set()
+        self._offsets: list[int] = [0]
+        self._width = 0
+        self._wrapped: OrderedDict[str, list[str]] = OrderedDict()
+        self.history_pending = False
+        self.history_complete = False
+        super().__init__(name=name, id=id, classes=classes)
+
+    @property
+    def line_count(self) -> int:
+        return self._offsets[-1]
+
+    @cached_property
+    def metrics(self) -> Metrics:
+        session = getattr(self.app, "session", None)
+        return session.metrics if session is not None else Metrics()
+
     def on_thread_new_thread_message(self, message: Thread.NewThreadMessage):
-        msg_rows = []
-        if len(self.children) > 0:
-            after = self.children[-1].id
+        with self.metrics.timer("render_seconds", widget="thread", stage="append"):
+            # received messages go above the pending ones, which they may confirm
+            start = len(self.messages) - len(self.pending)
+            for msg_id in message.confirmed:
+                self._confirm(msg_id)
+            self.messages[start:] = [*message.thread_msgs, *self.pending.values()]
+            del self._offsets[start + 1 :]
+            self._relayout_from(start)
+            if message.auto_scroll and not self.is_vertical_scrollbar_grabbed:
+                self.scroll_end(animate=False)
+        self.call_after_refresh(self._check_history)
+
+    def echo(self, msg: ThreadMessage):
+        """Show a message the user is sending, until the server echoes it."""
+        self.pending[msg.id] = msg
+        self.messages.append(msg)
+        self._relayout_from(len(self.messages) - 1)
+        self.scroll_end(animate=False)
+
+    def mark_failed(self, msg: ThreadMessage, failed: bool = True):
+        if msg.id not in self.pending:
+            return
+        if failed:
+            self.failed.add(msg.id)
         else:
-            after = None
+            self.failed.discard(msg.id)
+        self.refresh()
 
-        for msg in message.thread_msgs:
-            if self.screen.user_id == msg.user_id:  # type: ignore
-                classes = "right_message_row"
-            else:
-                classes = None
+    def _confirm(self, msg_id: str):
+        """Drop a pending message, the server has sent it back."""
+        msg = self.pending.pop(msg_id, None)
+        if msg is None:
+            return
+        self.failed.discard(msg_id)
+        # both times are taken on this machine
+        self.metrics.observe(
+            "message_echo_seconds", time.time() - msg.time, widget="thread"
+        )
+
+    def on_thread_old_thread_message(self, message: Thread.OldThreadMessage):
+        with self.metrics.timer("render_seconds", widget="thread", stage="prepend"):
+            self._prepend(message.thread_msgs)
+
+    def _prepend(self, thread_msgs: List[ThreadMessage]):
+        self.history_pending = False
+        if self.messages:
+            oldest = self.messages[0].time
+            msgs = [msg for msg in thread_msgs if msg.time < oldest]
+        else:
+            msgs = thread_msgs
+        if not msgs:
+            self.history_complete = True
+            return
+
+        self.messages[:0] = msgs
+        if self._width == 0:
+            return
+        offsets = [0]
+        for msg in msgs:
+            offsets.append(offsets[-1] + len(self._wrap(msg)) + 1)
+        added = offsets.pop()
+        self._offsets = offsets + [offset + added for offset in self._offsets]
+        self.virtual_size = Size(self._width, self.line_count)
+        self.scroll_to(y=self.scroll_y + added, animate=False)
+        self.refresh()
+
+    def watch_scroll_y(self, old_value: float, new_value: float) -> None:
+        super().watch_scroll_y(old_value, new_value)
+        self._check_history()
+
+    def _check_history(self):
+        """Ask for older messages while the viewport is near the top."""
+        prefetch = self.size.height
+        if self.history_pending:
+            if self.scroll_y > prefetch * 2:
+                self.history_pending = False
+                self.post_message(self.HistoryCancelled(self))
+        elif self.messages and not self.history_complete:
+            if self.scroll_y <= prefetch:
+                self.history_pending = True
+                self.post_message(self.HistoryRequested(self, self.messages[0].time))
 
-            msg_rows.append(MessageRow(MessageStatic(msg.message), classes=classes))
+    def on_resize(self):
+        if self.size.width != self._width:
+            self._width = self.size.width
+            self._wrapped.clear()
+            self._offsets = [0]
+            self._relayout_from(0)
+            self.call_after_refresh(self._check_history)
 
-        self.mount_all(msg_rows, after=after)
-        if message.auto_scroll and not self.is_vertical_scrollbar_grabbed:
-            self.scroll_end(animate=False)
+    def _relayout_from(self, start: int):
+        """Compute line offsets for `messages[start:]` at the current width."""
+        if self._width == 0:
+            return
+        offsets = self._offsets
+        for msg in self.messages[start:]:
+            offsets.append(offsets[-1] + len(self._wrap(msg)) + 1)
+        self.virtual_size = Size(self._width, self.line_count)
+        self.refresh()
+
+    def _wrap(self, msg: ThreadMessage) -> list[str]:
+        lines = self._wrapped.get(msg.id)
+        if lines is None:
+            width = max(1, int(self._width * self.MESSAGE_WIDTH))
+            text = Text(msg.message).wrap(self.app.console, width)
+            lines = [line.plain.rstrip() for line in text]
+            self._wrapped[msg.id] = lines
+            if len(self._wrapped) > self.WRAP_CACHE_SIZE:
+                self._wrapped.popitem(last=False)
+        else:
+            self._wrapped.move_to_end(msg.id)
+        return lines
+
+    def render_lines(self, crop: Region) -> list[Strip]:
+        with self.metrics.timer("render_seconds", widget="thread", stage="lines"):
+            return super().render_lines(crop)
+
+    def render_line(self, y: int) -> Strip:
+        _, scroll_y = self.scroll_offset
+        y += scroll_y
+        width = self.size.width
+        style = self.rich_style
+        if y >= self.line_count:
+            return Strip.blank(width, style)
+
+        index = bisect_right(self._offsets, y) - 1
+        msg = self.messages[index]
+        lines = self._wrap(msg)
+        row = y - self._offsets[index]
+        if row >= len(lines):
+            return Strip.blank(width, style)
+
+        text_style = style
+        mark = ""
+        if msg.id in self.pending:
+            if msg.id in self.failed:
+                text_style += self.get_component_rich_style("thread--failed")
+                mark = self.FAILED_MARK if row == 0 else " " * len(self.FAILED_MARK)
+            else:
+                text_style += self.get_component_rich_style("thread--pending")
+        if self.screen.user_id == msg.user_id:  # type: ignore
+            indent = width - max(cell_len(line) for line in lines) - len(mark)
+        else:
+            indent = 0
+        strip = Strip(
+            [
+                Segment(" " * max(0, indent), style),
+                Segment(mark + lines[row], text_style),
+            ]
+        )
+        return strip.adjust_cell_length(width, style)
 
 
 class ChatScreen(Screen):
+    """All threads of the user as tabs, fed by one downstream socket.
+
+    Frames from `/messages/down` are routed to the tab of their thread; joining
+    a thread resubscribes the socket with the extra offset instead of opening
+    another connection.
+    """
+
     class ThreadDeleted(Message):
-        pass
+        def __init__(self, thread_id: ThreadID) -> None:
+            self.thread_id = thread_id
+            super().__init__()
+
+    class ThreadJoined(Message):
+        def __init__(self, thread_id: ThreadID, activate: bool = False) -> None:
+            self.thread_id = thread_id
+            self.activate = activate
+            super().__init__()
 
     BINDINGS = [
         ("ctrl+l", "leave", "Leave Chat"),
+        ("ctrl+n", "new_chat", "New Chat"),
+        ("ctrl+r", "retry", "Retry Failed"),
     ]
 
+    FLUSH_INTERVAL = 1 / 30
+    HISTORY_SIZE = 50
+
     def __init__(
         self,
         user_id: str,
-        thread_id: str,
+        thread_ids: Iterable[ThreadID],
+        history: dict[ThreadID, HistoryPrefetch] | None = None,
         name: str | None = None,
         id: str | None = None,
         classes: str | None = None,
     ) -> None:
         self.user_id = user_id
-        self.thread_id = thread_id
+        self.history = history or {}
+        self._thread_numbers = count(1)
+        self.threads: dict[ThreadID, Thread] = {
+            thread_id: self._new_thread(thread_id)
+            for thread_id in dict.fromkeys(thread_ids)
+        }
+        self.panes: dict[ThreadID, str] = {}
+        self.unread: Counter[ThreadID] = Counter()
+        self.downlink: MessageDownlink | None = None
         self.leaving_lock = asyncio.Lock()
+        self._unsubscribe: list[Callable[[], None]] = []
         super().__init__(name, id, classes)
 
+    def reset(
+        self,
+        user_id: str,
+        thread_ids: Iterable[ThreadID],
+        history: dict[ThreadID, HistoryPrefetch] | None = None,
+    ):
+        """Reuse the screen for `thread_ids`, the newest one shown."""
+        self.user_id = user_id
+        self.history.update(history or {})
+        for thread_id in thread_ids:
+            self.post_message(self.ThreadJoined(thread_id, activate=True))
+
+    @property
+    def thread_id(self) -> ThreadID | None:
+        """The thread of the active tab."""
+        for thread_id, pane_id in self.panes.items():
+            if pane_id == self.tabs.active:
+                return thread_id
+        return None
+
+    @property
+    def thread(self) -> Thread:
+        return self.threads[self.thread_id]  # type: ignore
+
     def compose(self) -> ComposeResult:
-        self.thread = Thread()
+        self.tabs = TabbedContent()
         self.thread_input = Input(id="chat_input", placeholder="Enter text here")
         yield Header(show_clock=True)
-        yield Vertical(
-            self.thread,
-            self.thread_input,
-            id="chat_middle",
-        )
+        with Vertical(id="chat_middle"):
+            with self.tabs:
+                for thread_id, thread in self.threads.items():
+                    yield self._pane(thread_id, thread)
+            yield self.thread_input
         yield Footer()
 
     async def on_mount(self):
-        self.notification_worker = self.listen_notification()
-        now = time.time()
-        old_msgs = await ThreadService.fetch_old_messages(self.thread_id, now)
+        self.session: Session = self.app.session  # type: ignore
+        self.listen_notification()
+        self.store = MessageStore(self.user_id)
+        self.outbox = Outbox(self.session, self.store, on_result=self.outbox_result)
+        thread_ids = list(self.threads)
+        loaded = await asyncio.gather(*(self._load_latest(t) for t in thread_ids))
+        offset, seen = {}, []
+        for thread_id, latest in zip(thread_ids, loaded):
+            if latest is None:
+                await self._drop_thread(thread_id)
+                continue
+            offset[thread_id] = latest[0]
+            seen += latest[1]
+        self._subscribe(offset, seen)
+        # messages typed before a restart are still waiting to be sent
+        for msg in self.store.queued():
+            if msg.thread_id in self.threads:
+                self.threads[msg.thread_id].echo(msg)
+        self.flush_outbox()
+        if self.session.user_id is not None:
+            # open the upstream socket before the first message is typed
+            self.session.uplink.connect()
+        self.sync_threads()
+        if thread_ids and not self.threads:
+            # every thread failed to load, a prewarmed screen starts empty
+            self.action_new_chat()
+
+    def on_unmount(self):
+        for unsubscribe in self._unsubscribe:
+            unsubscribe()
+        self._unsubscribe.clear()
+        self.store.close()
+
+    async def _load_latest(self, thread_id: ThreadID) -> tuple[float, list[str]] | None:
+        """Show the newest page of a thread, return its offset and shown ids.
+
+        Returns None if the history cannot be fetched, e.g. for a thread the
+        user has left since the thread list was cached.
+        """
+        thread = self.threads[thread_id]
+        history = self.history.pop(thread_id, None)
+        stored_msgs = self.store.latest(thread_id, self.HISTORY_SIZE)
+        if stored_msgs:
+            if history is not None:
+                history.messages.cancel()
+            thread.post_message(Thread.NewThreadMessage(stored_msgs))
+            return stored_msgs[-1].time, [msg.id for msg in stored_msgs]
+        history = history or HistoryPrefetch.start(self.session, thread_id)
+        try:
+            old_msgs = await history.messages
+        except exceptions.APIError as e:
+            self.log.warning(f"cannot load thread {thread_id}: {e}")
+            return None
         old_msgs.sort(key=lambda x: x.time)
-        self.thread.post_message(Thread.NewThreadMessage(old_msgs))
-        self.message_worker = self.listen_message({self.thread_id: now})
+        self.store.save_later(thread_id, old_msgs)
+        thread.post_message(Thread.NewThreadMessage(old_msgs))
+        return history.offset, []
 
-    async def on_input_submitted(self, event: Input.Submitted):
-        if not event.value:
-            return
+    async def _drop_thread(self, thread_id: ThreadID):
+        del self.threads[thread_id]
+        self.unread.pop(thread_id, None)
+        await self.tabs.remove_pane(self.panes.pop(thread_id))  # type: ignore
+        # labels are numbered by position, the tabs after this one move up
+        self._update_labels()
+
+    def _new_thread(self, thread_id: ThreadID) -> Thread:
+        return Thread(thread_id, id=f"thread-{next(self._thread_numbers)}")
+
+    def _pane(self, thread_id: ThreadID, thread: Thread) -> TabPane:
+        pane_id = f"pane-{thread.id}"
+        self.panes[thread_id] = pane_id
+        return TabPane(self._label(thread_id), thread, id=pane_id)
+
+    def _label(self, thread_id: ThreadID) -> str:
+        label = f"Chat {list(self.threads).index(thread_id) + 1}"
+        if unread := self.unread[thread_id]:
+            label += f" ({unread})"
+        return label
+
+    def _update_label(self, thread_id: ThreadID):
+        tab = self.tabs.query_one(f"Tab#{self.panes[thread_id]}", Tab)
+        tab.label = Text(self._label(thread_id))
+        tab.update(tab.label)
+
+    def _update_labels(self):
+        for thread_id in self.panes:
+            self._update_label(thread_id)
+
+    def on_tabbed_content_tab_activated(self, event: TabbedContent.TabActivated):
+        self._tab_shown()
+
+    def _tab_shown(self):
+        thread_id = self.thread_id
+        if thread_id is not None and self.unread.pop(thread_id, 0):
+            self._update_label(thread_id)
+        self.thread_input.focus()
+
+    def on_thread_history_requested(self, message: Thread.HistoryRequested):
+        thread_id = message.thread.thread_id
+        self.run_worker(
+            self.load_history(thread_id, message.before),  # type: ignore
+            group=f"chat_screen_load_history_{thread_id}",
+            exclusive=True,
+        )
+
+    def on_thread_history_cancelled(self, message: Thread.HistoryCancelled):
+        thread_id = message.thread.thread_id
+        self.workers.cancel_group(self, f"chat_screen_load_history_{thread_id}")
+
+    def on_input_submitted(self, event: Input.Submitted):
         text = event.value.strip()
-        await ThreadService.send_message(self.thread_id, text)
+        if not text or self.thread_id is None:
+            return
+        # never wait for the network, the message is shown as pending instead
         self.thread_input.clear()
+        self.thread.echo(self.outbox.put(self.thread_id, self.user_id, text))
 
-    @work(exclusive=True, group="chat_screen_listen_notification")
-    async def listen_notification(self):
-        offset = await NotificationService.get_last_read_offset()
-        sub_pattern = {
-            "details": {"thread_id": self.thread_id},
-        }
+    @work(exclusive=True, group="chat_screen_flush_outbox")
+    async def flush_outbox(self):
+        await self.outbox.run()
+
+    def outbox_result(self, msg: ThreadMessage, sent: bool):
+        thread = self.threads.get(msg.thread_id)  # type: ignore
+        if thread is not None:
+            thread.mark_failed(msg, not sent)
 
-        async for n in NotificationService.iterate(offset):
-            await NotificationService.update_last_read_offset(n["time"])
-            match n:
-                case sub_pattern if n["code"] == "thread_leaved":  # noqa: F841
-                    self.post_message(self.ThreadDeleted())
-                    return
-                case sub_pattern if n["code"] == "thread_joined":  # noqa: F841
-                    pass
+    def action_retry(self):
+        for thread in self.threads.values():
+            for msg_id in list(thread.failed):
+                thread.mark_failed(thread.pending[msg_id], False)
+        self.outbox.retry()
+
+    def listen_notification(self):
+        # the app keeps one notification stream, this screen only subscribes
+        hub = self.app.notifications  # type: ignore
+        self._unsubscribe = [
+            hub.subscribe(self._on_notification, "thread_leaved"),
+            hub.subscribe(self._on_notification, "thread_joined"),
+        ]
+
+    def _on_notification(self, n: dict):
+        thread_id = n["details"]["thread_id"]
+        if n["code"] == "thread_leaved":
+            self.post_message(self.ThreadDeleted(thread_id))
+        else:
+            self.post_message(self.ThreadJoined(thread_id))
+
+    def _subscribe(self, offset: dict[ThreadID, float], seen: list[str]):
+        """Point the one downstream socket at `offset`, close it when empty.
+
+        The socket subscribes once per connection, so a change in threads
+        restarts the exclusive worker, which closes the previous socket.
+        """
+        if offset:
+            self.message_worker = self.listen_message(offset, seen)
+        else:
+            self.workers.cancel_group(self, "chat_screen_listen_message")
+            self.downlink = None
 
     @work(exclusive=True, group="chat_screen_listen_message")
-    async def listen_message(self, offset):
-        async for msg in ThreadService.iterate_new(offset):
-            self.thread.post_message(Thread.NewThreadMessage([msg]))
+    async def listen_message(self, offset, seen):
+        self.downlink = MessageDownlink(
+            self.session, offset, seen=seen, on_state=self.downlink_state_changed
+        )
+        async for msg_batch in coalesce(self.downlink, self.FLUSH_INTERVAL):
+            by_thread: dict[ThreadID, list[ThreadMessage]] = {}
+            for msg in msg_batch:
+                if msg.thread_id in self.threads:
+                    by_thread.setdefault(msg.thread_id, []).append(msg)
+                else:
+                    # with several threads open, a frame without tid has no home
+                    reason = "no_thread" if msg.thread_id is None else "left_thread"
+                    self.session.metrics.inc(
+                        "stream_frames_dropped_total",
+                        stream="messages_down",
+                        reason=reason,
+                    )
+                    self.log.warning(f"dropped message {msg.id}: {reason}")
+            for thread_id, msgs in by_thread.items():
+                self.store.save_later(thread_id, msgs)
+                # only the live downlink carries echoes of what the outbox sent
+                echoes = (
+                    self.outbox.confirm(m) for m in msgs if m.user_id == self.user_id
+                )
+                confirmed = [msg.id for msg in echoes if msg is not None]
+                self.threads[thread_id].post_message(
+                    Thread.NewThreadMessage(msgs, confirmed=confirmed)
+                )
+                if thread_id != self.thread_id:
+                    self.unread[thread_id] += len(msgs)
+                    self._update_label(thread_id)
+
+    @work(exclusive=True, group="chat_screen_sync_threads")
+    async def sync_threads(self):
+        """Add threads the screen was not opened with, e.g. after a new match."""
+        try:
+            thread_ids = await self.session.users.fetch_thread_ids()
+        except exceptions.APIError as e:
+            self.log.warning(e)
+            return
+        for thread_id in thread_ids:
+            self.post_message(self.ThreadJoined(thread_id))
+
+    async def load_history(self, thread_id: ThreadID, before: float):
+        thread = self.threads[thread_id]
+        msgs = self.store.before(thread_id, before, self.HISTORY_SIZE)
+        if not msgs:
+            try:
+                msgs = await self.session.threads.fetch_old_messages(thread_id, before)
+            except exceptions.APIError as e:
+                self.log.warning(e)
+                thread.history_pending = False
+                return
+            msgs.sort(key=lambda x: x.time)
+            self.store.save_later(thread_id, msgs)
+        thread.post_message(Thread.OldThreadMessage(msgs))
+
+    def downlink_state_changed(self, connected: bool):
+        if connected:
+            self.notify("Reconnected")
+        else:
+            self.notify("Connection lost, reconnecting...", severity="warning")
 
     async def action_leave(self):
+        if self.thread_id is None:
+            return
         async with self.leaving_lock:
             try:
-                await ThreadService.leave(self.thread_id)  # type: ignore
+                await self.session.threads.leave(self.thread_id)
             except Exception as e:
                 self.log.error(e)
 
-    def on_chat_screen_thread_deleted(self, message: ChatScreen.ThreadDeleted):
-        self.notification_worker.cancel()
-        screen_class = self.app.screen_context.next()  # type: ignore
-        self.app.switch_screen(screen_class(self.user_id))
+    def action_new_chat(self):
+        # the screen stays installed and keeps listening while matching
+        context = self.app.screen_context  # type: ignore
+        self.app.switch_screen(context.screen(context.next(), self.user_id))
+
+    async def on_chat_screen_thread_joined(self, message: ChatScreen.ThreadJoined):
+        thread_id = message.thread_id
+        if thread_id not in self.threads:
+            thread = self.threads[thread_id] = self._new_thread(thread_id)
+            await self.tabs.add_pane(self._pane(thread_id, thread))  # type: ignore
+            self._update_labels()
+            latest = await self._load_latest(thread_id)
+            if latest is None:
+                await self._drop_thread(thread_id)
+                return
+            offset, seen = latest
+            for msg in self.store.queued(thread_id):
+                thread.echo(msg)
+            if self.downlink is not None:
+                self._subscribe(
+                    {**self.downlink.offset, thread_id: offset},
+                    [*self.downlink.seen_ids, *seen],
+                )
+            else:
+                self._subscribe({thread_id: offset}, seen)
+        if message.activate:
+            self.tabs.active = self.panes[thread_id]
+            self._tab_shown()
+
+    async def on_chat_screen_thread_deleted(self, message: ChatScreen.ThreadDeleted):
+        thread_id = message.thread_id
+        if thread_id not in self.threads:
+            return
+        self.outbox.discard(thread_id)
+        await self._drop_thread(thread_id)
+        if self.downlink is not None:
+            self._subscribe(
+                {t: o for t, o in self.downlink.offset.items() if t in self.threads},
+                self.downlink.seen_ids,
+            )
+        if not self.threads:
+            self.action_new_chat()
@@ -1,14 +1,14 @@
 from datetime import datetime
 
-import pyperclip  # type: ignore
 from textual.app import ComposeResult
 from textual.containers import Container
 from textual.screen import Screen
 from textual.widgets import Footer, Header, Input, Static
 
 from app import exceptions
-from app.jwt import JWTService
-from app.user import User, UserService
+
+# The login screen is the first thing users see, so the network and clipboard
+# modules are imported when they are first needed rather than at start-up.
 
 
 class LoginDescription(Static):
@@ -27,7 +27,7 @@ class LoginDescription(Static):
 
     async def action_create_account(self):
         try:
-            secret = await UserService.create()
+            secret = await self.app.session.users.create()  # type: ignore
             self.prefix_desc = (
                 "Account created\n\nClick [@click=copy_input()]here[/] copy"
             )
@@ -38,6 +38,8 @@ class LoginDescription(Static):
             self.append_log(e.msg)
 
     def action_copy_input(self):
+        import pyperclip  # type: ignore
+
         pyperclip.copy(self.secret_input.value)
         self.prefix_desc = "Copied!\n\nPress ↩ to login"
         self.update(self.description)
@@ -76,23 +78,39 @@ class LoginInput(Input):
         if not event.value:
             return
         secret = event.value.strip()
+
+        from app.prefetch import HistoryPrefetch, prefetch
+        from app.user import User
+
+        session = self.app.session  # type: ignore
         try:
-            jwt = await JWTService.login(secret)
+            jwt = await session.tokens.login(secret)
             user = User(jwt.user_id, secret)
-            thread_ids = await UserService.fetch_thread_ids()
-            if len(thread_ids) == 1:
-                user.thread_id = thread_ids[0]
+            # warm the ticket cache for the match screen while threads load
+            prefetch(session.tickets.get_tickets())
+            user.thread_ids = await session.users.fetch_thread_ids()
         except exceptions.APIError as e:
             self.app.screen.query_one(LoginDescription).append_log(e.msg)
         else:
-            screen_class = self.app.screen_context.next()  # type: ignore
-            if user.thread_id is not None:
-                screen_class = self.app.screen_context.next()  # type: ignore
+            # open the notification stream once the next screen is painted
+            self.app.call_after_refresh(self.app.notifications.start)  # type: ignore
+            context = self.app.screen_context  # type: ignore
+            screen_class = context.next()
+            if user.thread_ids:
+                history = {
+                    thread_id: HistoryPrefetch.start(session, thread_id)
+                    for thread_id in user.thread_ids
+                }
+                screen_class = context.next()
                 self.app.switch_screen(
-                    screen_class(user.id, user.thread_id)
+                    context.screen(
+                        screen_class, user.id, user.thread_ids, history=history
+                    )
                 )  # go to chat screen
             else:
-                self.app.switch_screen(screen_class(user.id))  # go to match screen
+                self.app.switch_screen(
+                    context.screen(screen_class, user.id)
+                )  # go to match screen
 
 
 class LoginScreen(Screen[str]):
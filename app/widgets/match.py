@@ -1,13 +1,15 @@
 from __future__ import annotations
 
+import asyncio
+
 from textual import work
 from textual.app import ComposeResult
 from textual.message import Message
 from textual.screen import Screen
 from textual.widgets import Footer, Header, Static
 
-from app.ticket import TicketService
-from app.user import UserService
+from app import exceptions
+from app.backoff import Backoff
 
 
 class MatchScreen(Screen):
@@ -18,6 +20,10 @@ class MatchScreen(Screen):
 
     BINDINGS = [("enter", "start_match", "match")]
 
+    RETRY_BASE = 1.0
+    RETRY_CAP = 30.0
+    RETRY_BUDGET = 8
+
     def __init__(
         self,
         user_id: str,
@@ -26,22 +32,43 @@ class MatchScreen(Screen):
         classes: str | None = None,
     ) -> None:
         self.user_id = user_id
+        self.pick_up_tickets = True
         super().__init__(name, id, classes)
 
+    def reset(self, user_id: str):
+        self.user_id = user_id
+        self.pick_up_tickets = True
+
     def compose(self) -> ComposeResult:
         yield Header(show_clock=True)
         yield Static(id="match_screen_welcome_text")
         yield Footer()
 
-    async def on_mount(self):
+    def on_mount(self):
+        self.ticket_id = None
+        self.waiting = False
+        self.tickets = self.app.session.tickets  # type: ignore
+
+    async def on_screen_resume(self):
+        # the screen is kept between matches, pick up from the server's tickets
+        # when coming back from a chat, not when a modal such as F12 pops
+        if self.waiting or not self.pick_up_tickets:
+            return
+        self.pick_up_tickets = False
         self.ticket_id = None
-        _tickets = await TicketService.get_tickets()
-        tickets = []
-        for ticket in _tickets:
-            if ticket.thread_id is not None:
-                await TicketService.delete_ticket(ticket.id)
-            else:
-                tickets.append(ticket)
+        _tickets = await self.tickets.get_tickets()
+        tickets = [ticket for ticket in _tickets if ticket.thread_id is None]
+        results = await asyncio.gather(
+            *(
+                self.tickets.delete_ticket(ticket.id)
+                for ticket in _tickets
+                if ticket.thread_id is not None
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                self.log.warning(result)
 
         assert len(tickets) < 2
         if len(tickets) == 1:
@@ -54,9 +81,12 @@ class MatchScreen(Screen):
 
     async def action_start_match(self):
         if self.ticket_id is not None:
+            if not self.waiting:
+                self.query_one(Static).update("Matching...")
+                self.wait_matching_result(self.ticket_id)
             return
         try:
-            self.ticket_id = await UserService.start_matching()
+            self.ticket_id = await self.app.session.users.start_matching()  # type: ignore
             self.query_one(Static).update("Matching...")
         except Exception as e:
             self.log.error(e)
@@ -65,17 +95,48 @@ class MatchScreen(Screen):
 
     @work(exclusive=True, group="match_screen")
     async def wait_matching_result(self, ticket_id: str):
-        while True:
-            try:
-                thread_id = await TicketService.wait_matching_result(ticket_id)
-                await TicketService.delete_ticket(ticket_id)
-            except Exception as e:
-                self.log.warning(e)
-                continue
-            else:
-                self.post_message(self.Matched(thread_id))
-                break
+        self.waiting = True
+        # build the chat screen while the server looks for a partner
+        self.app.screen_context.prewarm(self.user_id, [])  # type: ignore
+        backoff = Backoff(base=self.RETRY_BASE, cap=self.RETRY_CAP)
+        status = self.query_one(Static)
+        try:
+            while True:
+                try:
+                    thread_id = await self.tickets.wait_matching_result(ticket_id)
+                except TimeoutError:
+                    # the server closes long polls with 524, subscribe again
+                    backoff.reset()
+                    continue
+                except exceptions.WrongTicket as e:
+                    self.log.warning(e)
+                    self.ticket_id = None
+                    status.update("Press ↩ to match")
+                    return
+                except Exception as e:
+                    self.log.warning(e)
+                    if backoff.attempts >= self.RETRY_BUDGET:
+                        status.update("Matching interrupted, press ↩ to retry")
+                        return
+                    delay = backoff.next()
+                    status.update(
+                        f"Connection problem, retry {backoff.attempts}"
+                        f"/{self.RETRY_BUDGET} in {delay:.1f}s"
+                    )
+                    await asyncio.sleep(delay)
+                    status.update("Matching...")
+                else:
+                    break
+        finally:
+            self.waiting = False
+
+        try:
+            await self.tickets.delete_ticket(ticket_id)
+        except exceptions.APIError as e:
+            self.log.warning(e)
+        self.post_message(self.Matched(thread_id))
 
     async def on_match_screen_matched(self, message: MatchScreen.Matched):
-        screen_class = self.app.screen_context.next()  # type: ignore
-        self.app.switch_screen(screen_class(self.user_id, message.thread_id))
+        context = self.app.screen_context  # type: ignore
+        screen = context.screen(context.next(), self.user_id, [message.thread_id])
+        self.app.switch_screen(screen)
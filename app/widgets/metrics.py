@@ -0,0 +1,71 @@
+from textual.app import ComposeResult
+from textual.containers import VerticalScroll
+from textual.screen import ModalScreen
+from textual.widgets import Footer, Static
+
+from app.base import DATA_DIR
+from app.metrics import Metrics
+from app.resources import Resources
+
+
+class MetricsScreen(ModalScreen):
+    """Debug panel with the live metrics of the session, over any screen."""
+
+    DEFAULT_CSS = """
+    MetricsScreen {
+        align: center middle;
+    }
+
+    #metrics_panel {
+        width: 90%;
+        height: 80%;
+        border: tall $warning;
+        background: $boost;
+        padding: 0 1;
+    }
+    """
+
+    BINDINGS = [
+        ("f12,escape", "app.pop_screen", "Close"),
+        ("j", "export('json')", "Export JSON"),
+        ("p", "export('prom')", "Export Prometheus"),
+    ]
+
+    REFRESH_INTERVAL = 1.0
+
+    def __init__(self, metrics: Metrics, resources: Resources | None = None) -> None:
+        self.metrics = metrics
+        self.resources = resources
+        super().__init__()
+
+    def describe(self) -> str:
+        live = self.resources.counts() if self.resources is not None else {}
+        live["worker"] = sum(1 for worker in self.app.workers if worker.is_running)
+        counts = ", ".join(f"{kind}s {n}" for kind, n in live.items())
+        return f"open: {counts}\n\n{self.metrics.render()}"
+
+    def compose(self) -> ComposeResult:
+        self.table = Static(self.describe())
+        with VerticalScroll(id="metrics_panel"):
+            yield self.table
+        yield Footer()
+
+    def on_mount(self):
+        self.query_one("#metrics_panel").border_title = "Metrics"
+        self.set_interval(self.REFRESH_INTERVAL, self.refresh_table)
+
+    def refresh_table(self):
+        self.table.update(self.describe())
+
+    def action_export(self, kind: str):
+        text = (
+            self.metrics.to_json() if kind == "json" else self.metrics.to_prometheus()
+        )
+        path = DATA_DIR / f"metrics.{kind}"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text)
+        except OSError as e:
+            self.notify(str(e), severity="error")
+        else:
+            self.notify(f"Metrics written to {path}")
@@ -4,6 +4,11 @@ from datetime import datetime, timedelta, timezone
 import jwt
 from pytest import fixture
 
+from app.auth import TokenManager
+from app.base import Service
+from app.fake_server import FakeServer
+from app.store import MessageStore
+
 
 @fixture
 def alice_jwt():
@@ -19,3 +24,18 @@ def alice_invalid_jwt():
     time.time()
     token = jwt.encode({"exp": exp, "id": "alice"}, key="secret")
     return token
+
+
+@fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(MessageStore, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(TokenManager, "TOKEN_PATH", tmp_path / "token.json")
+    return tmp_path
+
+
+@fixture
+async def fake_server(monkeypatch):
+    async with FakeServer() as server:
+        monkeypatch.setattr(Service, "BASE_URL", f"http://{server.domain}")
+        monkeypatch.setattr(Service, "WS_BASE_URL", f"ws://{server.domain}")
+        yield server
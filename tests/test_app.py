@@ -1,8 +1,20 @@
 from app.app import RandomChatApp
 from app.widgets.login import LoginScreen
+from app.widgets.metrics import MetricsScreen
 
 
 async def test_app_first_start():
     app = RandomChatApp()
     async with app.run_test():
         assert isinstance(app.screen, LoginScreen)
+
+
+async def test_metrics_panel_toggles():
+    app = RandomChatApp()
+    async with app.run_test() as pilot:
+        app.session.metrics.inc("jwt_refresh_total")
+        await pilot.press("f12")
+        assert isinstance(app.screen, MetricsScreen)
+        assert "jwt_refresh_total 1" in str(app.screen.table.renderable)
+        await pilot.press("f12")
+        assert isinstance(app.screen, LoginScreen)
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import time
+from unittest import mock
+
+import jwt
+import pytest
+
+from app.auth import TokenManager
+from app.jwt import JWT
+from app.session import Session
+
+
+@pytest.fixture
+def session():
+    return Session()
+
+
+@mock.patch("app.jwt.JWTService.login")
+async def test_concurrent_callers_share_one_refresh(
+    mock_login, session: Session, alice_jwt: str
+):
+    async def login(secret: str) -> JWT:
+        await asyncio.sleep(0.01)
+        return JWT(alice_jwt)
+
+    mock_login.side_effect = login
+    session.cache.set("secret", "secret")
+    manager = TokenManager(session)
+    tokens = await asyncio.gather(*(manager.get_token() for _ in range(10)))
+    await manager.aclose()
+    assert set(tokens) == {alice_jwt}
+    assert mock_login.call_count == 1
+
+
+@mock.patch("app.jwt.JWTService.login")
+async def test_token_is_refreshed_before_expiry(
+    mock_login, session: Session, alice_jwt: str
+):
+    exp = time.time() + 0.05
+    expiring = JWT(jwt.encode({"exp": exp, "id": "alice"}, key="secret"))
+    mock_login.side_effect = [expiring, JWT(alice_jwt)]
+    manager = TokenManager(session)
+    await manager.login("secret")
+    await asyncio.sleep(0.1)
+    await manager.aclose()
+    assert mock_login.call_count == 2
+    assert manager.refresh_count == 1
+
+
+@mock.patch("app.jwt.JWTService.login")
+async def test_persisted_token_skips_login(mock_login, alice_jwt: str):
+    mock_login.return_value = JWT(alice_jwt)
+    manager = TokenManager(Session())
+    manager.PERSIST = True
+    manager.REFRESH_SKEW = 1
+    await manager.login("secret")
+    await manager.aclose()
+    assert os.stat(manager.TOKEN_PATH).st_mode & 0o777 == 0o600
+
+    restarted = TokenManager(Session())
+    restarted.PERSIST = True
+    restarted.REFRESH_SKEW = 1
+    assert (await restarted.login("secret")).token == alice_jwt
+    await restarted.login("other secret")
+    await restarted.aclose()
+    assert mock_login.call_count == 2
+
+
+@mock.patch("app.jwt.JWTService.login")
+async def test_sessions_keep_their_own_token(mock_login, alice_jwt: str):
+    bob_jwt = jwt.encode({"exp": time.time() + 60, "id": "bob"}, key="secret")
+
+    async def login(secret: str) -> JWT:
+        return JWT(alice_jwt if secret == "alice" else bob_jwt)
+
+    mock_login.side_effect = login
+    alice, bob = Session(), Session()
+    await alice.tokens.login("alice")
+    await bob.tokens.login("bob")
+    assert (alice.user_id, bob.user_id) == ("alice", "bob")
+    assert await bob.tokens.get_token() == bob_jwt
+    await alice.aclose()
+    await bob.aclose()
@@ -0,0 +1,38 @@
+from app.app import RandomChatApp
+from app.base import ConnectionPool
+from app.session import Session
+
+
+async def test_pool_client_is_reused():
+    pool = ConnectionPool()
+    client = pool.client()
+    assert client is pool.client()
+    await pool.aclose()
+    assert client.is_closed
+    assert pool._client is None
+
+
+async def test_services_use_the_session_pool():
+    session = Session()
+    assert session.users.client() is session.tickets.client()
+    client = session.users.client()
+    await session.aclose()
+    assert client.is_closed
+
+
+async def test_shared_pool_outlives_sessions():
+    pool = ConnectionPool()
+    alice, bob = Session(pool), Session(pool)
+    assert alice.users.client() is bob.users.client()
+    assert alice.cache is not bob.cache
+    await alice.aclose()
+    assert not pool.client().is_closed
+    await bob.aclose()
+    await pool.aclose()
+
+
+async def test_app_exit_closes_client():
+    app = RandomChatApp()
+    async with app.run_test():
+        client = app.session.users.client()
+    assert client.is_closed
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import statistics
+import time
+
+from app.fake_server import FakeServer
+from app.session import Session
+from app.stream import MessageDownlink
+from tests.test_services import match, sign_up
+
+# End-to-end numbers through the real services against the local fake
+# server, run with `pytest tests/test_bench.py -s` to see the report.
+ROUNDS = int(os.getenv("BENCH_ROUNDS", default="20"))
+MESSAGES = int(os.getenv("BENCH_MESSAGES", default="200"))
+
+
+def report(name: str, samples: list[float]) -> dict[str, float]:
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    result = {"p50": cuts[49], "p90": cuts[89], "p99": cuts[98]}
+    print(
+        f"{name}: n={len(samples)} "
+        + " ".join(f"{k}={v * 1000:.2f}ms" for k, v in result.items())
+    )
+    return result
+
+
+async def test_bench_login(fake_server: FakeServer):
+    samples = []
+    for _ in range(ROUNDS):
+        session = Session()
+        secret = await session.users.create()
+        started = time.perf_counter()
+        await session.tokens.login(secret)
+        await session.users.fetch_thread_ids()
+        samples.append(time.perf_counter() - started)
+        await session.aclose()
+    assert report("login", samples)["p99"] < 1
+
+
+async def test_bench_match(fake_server: FakeServer):
+    samples = []
+    for _ in range(ROUNDS):
+        alice, bob = Session(), Session()
+        await asyncio.gather(sign_up(alice), sign_up(bob))
+        started = time.perf_counter()
+        await match(alice, bob)
+        samples.append(time.perf_counter() - started)
+        await alice.aclose()
+        await bob.aclose()
+    assert report("match", samples)["p99"] < 1
+
+
+async def test_bench_message_latency(fake_server: FakeServer):
+    alice, bob = Session(), Session()
+    await asyncio.gather(sign_up(alice), sign_up(bob))
+    thread_id = await match(alice, bob)
+    downlink = aiter(MessageDownlink(bob, {thread_id: time.time()}))
+    # open both sockets before measuring
+    await alice.uplink.send(thread_id, "warm up")
+    await anext(downlink)
+
+    sent: dict[str, float] = {}
+    samples: list[float] = []
+
+    async def receive():
+        while len(samples) < MESSAGES:
+            msg = await anext(downlink)
+            samples.append(time.perf_counter() - sent[msg.message])
+
+    receiving = asyncio.create_task(receive())
+    for i in range(MESSAGES):
+        sent[f"msg {i}"] = time.perf_counter()
+        await alice.uplink.send(thread_id, f"msg {i}")
+        await asyncio.sleep(0.001)
+    await asyncio.wait_for(receiving, 10)
+    await downlink.aclose()
+    await alice.aclose()
+    await bob.aclose()
+    assert report("send->receive", samples)["p99"] < 1
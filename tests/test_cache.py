@@ -0,0 +1,68 @@
+import asyncio
+
+from app.cache import TTLCache
+
+
+def test_entries_expire(monkeypatch):
+    now = 100.0
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: now)
+    cache = TTLCache()
+    cache.set("a", 1, ttl=5)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    now = 106.0
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2)
+    threads = cache.namespace("threads")
+    threads.set("a", 1)
+    threads.set("b", 2)
+    threads.get("a")
+    threads.set("c", 3)
+    assert threads.get("b") is None
+    assert threads.get("a") == 1
+    assert cache.stats()["threads"] == {
+        "size": 2,
+        "hits": 2,
+        "misses": 1,
+        "evictions": 1,
+    }
+
+
+async def test_concurrent_misses_share_one_compute():
+    cache = TTLCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return ["t1"]
+
+    results = await asyncio.gather(
+        *(cache.get_or_compute("alice", compute, namespace="threads") for _ in range(5))
+    )
+    assert results == [["t1"]] * 5
+    assert await cache.get_or_compute("alice", compute, namespace="threads") == ["t1"]
+    assert calls == 1
+    assert cache.get("alice") is None
+
+
+async def test_delete_while_computing_discards_the_result():
+    cache = TTLCache()
+    results = iter((["t1"], ["t1", "t2"]))
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        return next(results)
+
+    stale = asyncio.ensure_future(cache.get_or_compute("alice", compute))
+    await asyncio.sleep(0)
+    cache.delete("alice")
+    assert await stale == ["t1"]
+    assert cache.get("alice") is None
+    assert await cache.get_or_compute("alice", compute) == ["t1", "t2"]
+    assert cache.get("alice") == ["t1", "t2"]
@@ -0,0 +1,330 @@
+import asyncio
+from unittest import mock
+
+from textual.app import App, ComposeResult
+from textual.screen import Screen
+from textual.widgets import Tab, Tabs
+
+from app import exceptions
+from app.session import Session
+from app.store import MessageStore
+from app.stream import Outbox
+from app.user import ThreadMessage
+from app.widgets.chat import ChatScreen, Thread
+
+
+class ThreadScreen(Screen):
+    user_id = "alice"
+
+    def compose(self) -> ComposeResult:
+        self.history_requests: list[Thread.HistoryRequested] = []
+        yield Thread()
+
+    def on_thread_history_requested(self, message: Thread.HistoryRequested):
+        self.history_requests.append(message)
+
+
+class ThreadApp(App):
+    def on_mount(self):
+        self.push_screen(ThreadScreen())
+
+
+def make_messages(n: int, start: int = 0) -> list[ThreadMessage]:
+    return [
+        ThreadMessage(
+            id=str(i),
+            time=float(i),
+            user_id="alice" if i % 2 else "bob",
+            message=f"message {i}",
+        )
+        for i in range(start, start + n)
+    ]
+
+
+async def test_thread_renders_without_child_widgets():
+    app = ThreadApp()
+    async with app.run_test() as pilot:
+        thread = app.screen.query_one(Thread)
+        thread.post_message(Thread.NewThreadMessage(make_messages(5000)))
+        await pilot.pause()
+        assert len(thread.children) == 0
+        assert len(thread.messages) == 5000
+        assert thread.line_count == 5000 * 2
+        assert thread.scroll_y == thread.max_scroll_y
+
+
+async def test_thread_aligns_own_messages_right():
+    app = ThreadApp()
+    async with app.run_test() as pilot:
+        thread = app.screen.query_one(Thread)
+        thread.post_message(Thread.NewThreadMessage(make_messages(2)))
+        await pilot.pause()
+        thread.scroll_home(animate=False)
+        await pilot.pause()
+        bob, _, alice, _ = (thread.render_line(y).text for y in range(4))
+        assert bob.startswith("message 0")
+        assert alice.rstrip().endswith("message 1")
+        assert not alice.startswith("message 1")
+
+
+async def test_thread_echoes_pending_messages_until_confirmed():
+    app = ThreadApp()
+    async with app.run_test() as pilot:
+        thread = app.screen.query_one(Thread)
+        first, second = (
+            ThreadMessage(id=f"outbox-{i}", time=9.0, user_id="alice", message=text)
+            for i, text in enumerate(("hello", "again"))
+        )
+        thread.echo(first)
+        thread.echo(second)
+        thread.post_message(Thread.NewThreadMessage(make_messages(1)))
+        await pilot.pause()
+        # received messages go above the ones still pending
+        assert [m.id for m in thread.messages] == ["0", first.id, second.id]
+        thread.mark_failed(second)
+        await pilot.pause()
+        assert thread.render_line(4).text.strip() == "✗ again"
+        # a history page with the same text is not an echo
+        history = ThreadMessage(id="h1", time=10.0, user_id="alice", message="hello")
+        thread.post_message(Thread.NewThreadMessage([history]))
+        await pilot.pause()
+        assert list(thread.pending) == [first.id, second.id]
+        echo = ThreadMessage(id="s1", time=1.0, user_id="alice", message="hello")
+        thread.post_message(Thread.NewThreadMessage([echo], confirmed=[first.id]))
+        await pilot.pause()
+        assert [m.id for m in thread.messages] == ["0", "h1", "s1", second.id]
+        assert list(thread.pending) == [second.id]
+        assert thread.line_count == 8
+
+
+@mock.patch("app.widgets.chat.ChatScreen.listen_message")
+@mock.patch("app.widgets.chat.ChatScreen.listen_notification")
+@mock.patch("app.user.UserService.fetch_thread_ids")
+@mock.patch("app.user.ThreadService.fetch_old_messages")
+async def test_chat_screen_renders_stored_history(
+    mock_fetch_old_messages,
+    mock_fetch_thread_ids,
+    mock_listen_notification,
+    mock_listen_message,
+):
+    mock_fetch_old_messages.return_value = []
+    mock_fetch_thread_ids.return_value = ["t1"]
+    store = MessageStore("alice")
+    store.save("t1", make_messages(3))
+    store.close()
+    app = App()
+    app.session = Session()  # type: ignore
+    async with app.run_test() as pilot:
+        screen = ChatScreen("alice", ["t1"])
+        await app.push_screen(screen)
+        await pilot.pause()
+        assert [m.id for m in screen.thread.messages] == ["0", "1", "2"]
+        # the initial page comes from the store, only the backfill hits the server
+        mock_fetch_old_messages.assert_called_once_with("t1", 0.0)
+        assert screen.thread.history_complete
+        mock_listen_message.assert_called_once_with({"t1": 2.0}, ["0", "1", "2"])
+
+
+class FakeDownlink:
+    """Yields the queued frames, then stays open like the real socket."""
+
+    frames: list[ThreadMessage] = []
+    instances: list["FakeDownlink"] = []
+
+    def __init__(self, session, offset, seen=(), on_state=None) -> None:
+        self.offset = dict(offset)
+        self.seen_ids = list(seen)
+        self.instances.append(self)
+
+    async def __aiter__(self):
+        for frame in self.frames:
+            yield frame
+        await asyncio.Event().wait()
+
+
+@mock.patch("app.widgets.chat.MessageDownlink", FakeDownlink)
+@mock.patch("app.widgets.chat.ChatScreen.listen_notification")
+@mock.patch("app.user.UserService.fetch_thread_ids")
+@mock.patch("app.user.ThreadService.fetch_old_messages")
+async def test_chat_screen_routes_one_downlink_to_thread_tabs(
+    mock_fetch_old_messages, mock_fetch_thread_ids, mock_listen_notification
+):
+    mock_fetch_old_messages.return_value = []
+    mock_fetch_thread_ids.return_value = ["t1", "t2"]
+    FakeDownlink.instances = []
+    FakeDownlink.frames = [
+        ThreadMessage(
+            id=str(i),
+            time=float(i),
+            user_id="bob",
+            message=f"message {i}",
+            thread_id="t1" if i % 3 == 0 else "t2",
+        )
+        for i in range(6)
+    ]
+    app = App()
+    app.session = Session()  # type: ignore
+    async with app.run_test() as pilot:
+        screen = ChatScreen("alice", ["t1", "t2"])
+        await app.push_screen(screen)
+        await pilot.pause(0.2)
+        # one socket subscribed to both threads
+        assert len(FakeDownlink.instances) == 1
+        assert set(FakeDownlink.instances[0].offset) == {"t1", "t2"}
+        assert [m.id for m in screen.threads["t1"].messages] == ["0", "3"]
+        assert [m.id for m in screen.threads["t2"].messages] == ["1", "2", "4", "5"]
+        assert screen.thread_id == "t1"
+        assert screen.unread == {"t2": 4}
+        # as if the tab was clicked
+        screen.query_one(Tabs).active = screen.panes["t2"]
+        await pilot.pause()
+        assert screen.thread_id == "t2"
+        assert not screen.unread
+
+
+@mock.patch("app.widgets.chat.MessageDownlink", FakeDownlink)
+@mock.patch("app.widgets.chat.ChatScreen.listen_notification")
+@mock.patch("app.user.UserService.fetch_thread_ids")
+@mock.patch("app.user.ThreadService.fetch_old_messages")
+async def test_chat_screen_drops_threads_that_fail_to_load(
+    mock_fetch_old_messages, mock_fetch_thread_ids, mock_listen_notification
+):
+    async def fetch_old_messages(thread_id: str, before=None):
+        if thread_id == "t2":
+            raise exceptions.ServiceError
+        return []
+
+    mock_fetch_old_messages.side_effect = fetch_old_messages
+    mock_fetch_thread_ids.return_value = ["t2", "t1"]
+    FakeDownlink.instances = []
+    FakeDownlink.frames = [
+        ThreadMessage(id="a", time=1.0, user_id="bob", message="a", thread_id="t1"),
+        ThreadMessage(id="b", time=2.0, user_id="bob", message="b"),
+    ]
+    app = App()
+    app.session = Session()  # type: ignore
+    async with app.run_test() as pilot:
+        # t2 was left, but the cached thread list still has it
+        screen = ChatScreen("alice", ["t2", "t1"])
+        await app.push_screen(screen)
+        await pilot.pause(0.2)
+        assert app.screen is screen
+        assert list(screen.threads) == list(screen.panes) == ["t1"]
+        assert set(FakeDownlink.instances[-1].offset) == {"t1"}
+        assert [m.id for m in screen.thread.messages] == ["a"]
+        metrics = app.session.metrics  # type: ignore
+        assert metrics.counter(
+            "stream_frames_dropped_total", stream="messages_down", reason="no_thread"
+        )
+        # tabs are renumbered, so a joined thread cannot repeat a label
+        screen.post_message(ChatScreen.ThreadJoined("t3"))
+        await pilot.pause(0.1)
+        labels = [str(tab.label) for tab in screen.query(Tab)]
+        assert labels == ["Chat 1", "Chat 2"]
+
+
+async def test_thread_prepends_history_without_moving_viewport():
+    app = ThreadApp()
+    async with app.run_test() as pilot:
+        thread = app.screen.query_one(Thread)
+        requests = app.screen.history_requests
+        thread.post_message(Thread.NewThreadMessage(make_messages(100, start=100)))
+        await pilot.pause()
+        assert requests == []
+        thread.scroll_to(y=10, animate=False)
+        await pilot.pause()
+        assert requests[-1].before == 100.0
+        top = thread.render_line(0).text
+        thread.on_thread_old_thread_message(Thread.OldThreadMessage(make_messages(100)))
+        await pilot.pause()
+        assert thread.messages[0].id == "0"
+        assert thread.render_line(0).text == top
+        assert not thread.history_pending
+
+
+@mock.patch("app.widgets.chat.ChatScreen.listen_message")
+@mock.patch("app.widgets.chat.ChatScreen.listen_notification")
+@mock.patch("app.user.UserService.fetch_thread_ids")
+@mock.patch("app.user.ThreadService.fetch_old_messages")
+@mock.patch.object(Outbox, "RETRY_BASE", 60.0)
+async def test_chat_screen_sends_without_blocking_and_retries(
+    mock_fetch_old_messages,
+    mock_fetch_thread_ids,
+    mock_listen_notification,
+    mock_listen_message,
+):
+    mock_fetch_old_messages.return_value = []
+    mock_fetch_thread_ids.return_value = ["t1"]
+    sent = []
+    offline = asyncio.Event()
+
+    async def send(thread_id: str, text: str):
+        await offline.wait()
+        if len(sent) == 0:
+            sent.append(None)
+            raise exceptions.NetworkError
+        sent.append((thread_id, text))
+
+    app = App()
+    app.session = Session()  # type: ignore
+    with mock.patch.object(app.session, "uplink") as uplink:
+        uplink.send.side_effect = send
+        async with app.run_test() as pilot:
+            screen = ChatScreen("alice", ["t1"])
+            await app.push_screen(screen)
+            await pilot.pause()
+            for text in ("hi", "there"):
+                screen.thread_input.value = text
+                await pilot.press("enter")
+            # shown and cleared while the send is still in flight
+            assert screen.thread_input.value == ""
+            assert [m.message for m in screen.thread.pending.values()] == [
+                "hi",
+                "there",
+            ]
+            offline.set()
+            await pilot.pause()
+            # the failed message holds back the one behind it
+            assert len(screen.thread.failed) == 1
+            assert len(screen.store.queued()) == 2
+            await pilot.press("ctrl+r")
+            await pilot.pause(2 / Outbox.RATE)
+            assert sent == [None, ("t1", "hi"), ("t1", "there")]
+            assert not screen.thread.failed
+            assert len(screen.thread.pending) == 2
+            # kept on disk until the server sends them back
+            assert len(screen.store.queued()) == 2
+            echo = ThreadMessage(
+                id="s1", time=0.0, user_id="alice", message="hi", thread_id="t1"
+            )
+            assert screen.outbox.confirm(echo) is not None
+            assert [m.message for m in screen.store.queued()] == ["there"]
+            assert screen.outbox.confirm(echo) is None
+
+
+@mock.patch("app.widgets.chat.ChatScreen.listen_message")
+@mock.patch("app.widgets.chat.ChatScreen.listen_notification")
+@mock.patch("app.user.UserService.fetch_thread_ids")
+@mock.patch("app.user.ThreadService.fetch_old_messages")
+async def test_chat_screen_sends_messages_queued_before_restart(
+    mock_fetch_old_messages,
+    mock_fetch_thread_ids,
+    mock_listen_notification,
+    mock_listen_message,
+):
+    mock_fetch_old_messages.return_value = []
+    mock_fetch_thread_ids.return_value = ["t1"]
+    store = MessageStore("alice")
+    queued = store.enqueue("t1", "alice", "typed offline", 1.0)
+    store.close()
+    app = App()
+    app.session = Session()  # type: ignore
+    with mock.patch.object(app.session, "uplink") as uplink:
+        uplink.send = mock.AsyncMock()
+        async with app.run_test() as pilot:
+            screen = ChatScreen("alice", ["t1"])
+            await app.push_screen(screen)
+            await pilot.pause()
+            assert list(screen.thread.pending) == [queued.id]
+            uplink.send.assert_awaited_once_with("t1", "typed offline")
+            assert [m.id for m in screen.store.queued()] == [queued.id]
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Start-up cost of the first screen, see `python -X importtime -m app.app`.
+STARTUP_MODULES = ("app.app", "app.widgets.login")
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", default="400"))
+LAZY_MODULES = {
+    "httpx",
+    "websockets",
+    "jwt",
+    "pyperclip",
+    "sqlite3",
+    "app.widgets.chat",
+    "app.widgets.match",
+}
+
+
+def import_profile() -> dict[str, int]:
+    """Return the cumulative import time in microseconds of each module."""
+    # pytest-cov starts coverage in subprocesses through these, and coverage
+    # imports modules of its own
+    env = {k: v for k, v in os.environ.items() if not k.startswith("COV_CORE_")}
+    proc = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import {', '.join(STARTUP_MODULES)}",
+        ],
+        cwd=Path(__file__).parent.parent,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def test_start_up_does_not_import_network_modules():
+    assert LAZY_MODULES.isdisjoint(import_profile())
+
+
+def test_start_up_import_time_budget():
+    runs = [import_profile() for _ in range(3)]
+    best_ms = min(sum(run[m] for m in STARTUP_MODULES) for run in runs) / 1000
+    print(f"start-up import time: {best_ms:.1f} ms (budget {IMPORT_TIME_BUDGET_MS} ms)")
+    assert best_ms < IMPORT_TIME_BUDGET_MS
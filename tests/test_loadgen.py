@@ -0,0 +1,51 @@
+import pytest
+
+from app.base import Service
+from app.fake_server import FakeServer
+from app.loadgen import LoadGenerator, main
+from app.metrics import Histogram
+
+
+def test_histogram_quantiles():
+    histogram = Histogram()
+    for ms in range(1, 101):
+        histogram.observe(ms / 1000)
+    assert histogram.count == 100
+    assert 0.04 < histogram.quantile(0.5) < 0.06
+    assert histogram.quantile(0.99) <= histogram.max == 0.1
+    assert "100ms" in histogram.render()
+
+
+async def test_load_generator_exchanges_messages(fake_server: FakeServer):
+    generator = LoadGenerator(users=4, rate=20, duration=0.5)
+    report = await generator.run()
+    assert not report.errors
+    assert report.sent >= 4 * 5
+    assert report.delivered == report.sent
+    assert report.latency["login"].count == 4
+    assert report.latency["match"].count == 4
+    assert report.latency["message"].count == report.delivered
+    assert "delivered" in report.render()
+
+
+async def test_unmatched_user_gives_up_at_the_deadline(fake_server: FakeServer):
+    generator = LoadGenerator(users=3, rate=20, duration=0.5)
+    report = await generator.run()
+    assert not report.errors
+    assert report.unmatched == 1
+    assert report.latency["match"].count == 2
+
+
+def test_cli_reports_connection_errors(capsys, monkeypatch):
+    # the CLI points the services at --domain
+    monkeypatch.setattr(Service, "BASE_URL", Service.BASE_URL)
+    monkeypatch.setattr(Service, "WS_BASE_URL", Service.WS_BASE_URL)
+    code = main(["--domain", "127.0.0.1:9", "--users", "2", "--duration", "0.1"])
+    assert code == 1
+    assert "NetworkError: 2" in capsys.readouterr().out
+
+
+def test_cli_rejects_odd_user_counts(capsys):
+    with pytest.raises(SystemExit):
+        main(["--users", "3"])
+    assert "--users must be even" in capsys.readouterr().err
@@ -1,6 +1,9 @@
+import asyncio
+import time
 from unittest import mock
 
 import pytest
+from textual.widgets import Static
 
 from app import exceptions
 from app.app import RandomChatApp
@@ -21,7 +24,6 @@ async def test_press_enter_while_empty_input():
     "thread_ids,tickets,screen", [([], [], MatchScreen), (["bob"], [], ChatScreen)]
 )
 @mock.patch("app.user.ThreadService.fetch_old_messages")
-@mock.patch("app.cache.Cache.get")
 @mock.patch("app.ticket.TicketService.get_tickets")
 @mock.patch("app.user.UserService.fetch_thread_ids")
 @mock.patch("app.jwt.JWTService.login")
@@ -29,7 +31,6 @@ async def test_loing_success(
     mock_login,
     mock_fetch_thread_ids,
     mock_get_tickets,
-    mock_get,
     mock_fetch_old_messages,
     thread_ids,
     tickets,
@@ -40,7 +41,6 @@ async def test_loing_success(
     mock_login.return_value = jwt
     mock_fetch_thread_ids.return_value = thread_ids
     mock_get_tickets.return_value = tickets
-    mock_get.return_value = jwt
     mock_fetch_old_messages.return_value = []
     app = RandomChatApp()
     async with app.run_test() as pilot:
@@ -86,3 +86,43 @@ async def test_acreate_account_fail(mock_create):
         assert not app.query_one(LoginInput).disabled
         assert app.query_one(LoginInput).value == ""
         assert "create fail" in str(app.query_one(LoginDescription).renderable)
+
+
+RTT = 0.2
+
+
+@mock.patch("app.ticket.TicketService._get_tickets")
+@mock.patch("app.user.UserService._fetch_thread_ids")
+@mock.patch("app.jwt.JWTService.login")
+async def test_login_to_match_screen_takes_one_round_trip_after_auth(
+    mock_login, mock_fetch_thread_ids, mock_get_tickets, alice_jwt: str
+):
+    jwt = JWT(alice_jwt)
+
+    async def login(secret: str) -> JWT:
+        await asyncio.sleep(RTT)
+        return jwt
+
+    async def round_trip():
+        await asyncio.sleep(RTT)
+        return []
+
+    mock_login.side_effect = login
+    mock_fetch_thread_ids.side_effect = round_trip
+    mock_get_tickets.side_effect = round_trip
+    app = RandomChatApp()
+    async with app.run_test() as pilot:
+        await pilot.click("#login_input")
+        await pilot.press("s")
+        started = time.perf_counter()
+        await pilot.press("enter")
+        while time.perf_counter() - started < 3 * RTT:
+            if isinstance(app.screen, MatchScreen) and any(
+                "Press ↩ to match" in str(status.renderable)
+                for status in app.screen.query(Static)
+            ):
+                break
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+    # login, then threads and tickets in parallel; serially this would be 3 RTT
+    assert elapsed < 2.5 * RTT
@@ -0,0 +1,178 @@
+import asyncio
+from unittest import mock
+
+from textual.app import App
+from textual.screen import ModalScreen, Screen
+from textual.widgets import Static
+
+from app import exceptions
+from app.jwt import JWT
+from app.screen_state import LoginState, ScreenContext
+from app.session import Session
+from app.ticket import Ticket
+from app.widgets.chat import ChatScreen
+from app.widgets.match import MatchScreen
+from tests.test_chat import FakeDownlink
+
+
+class MatchApp(App):
+    def on_mount(self):
+        self.session = Session()
+        self.screen_context = mock.Mock()
+        self.screen_context.next.return_value = self.chat_screen
+        self.screen_context.screen.side_effect = lambda screen, *args: screen(*args)
+        self.push_screen(MatchScreen("alice"))
+
+    def chat_screen(self, user_id: str, thread_ids: list[str]) -> Screen:
+        return Screen(name=thread_ids[0])
+
+
+@mock.patch.object(MatchScreen, "RETRY_BASE", 0.001)
+@mock.patch("app.ticket.TicketService.delete_ticket")
+@mock.patch("app.ticket.TicketService.wait_matching_result")
+@mock.patch("app.ticket.TicketService.get_tickets")
+async def test_matching_retries_with_backoff(
+    mock_get_tickets, mock_wait_matching_result, mock_delete_ticket
+):
+    mock_get_tickets.return_value = [
+        Ticket(id="waiting", thread_id=None),
+        Ticket(id="stale-1", thread_id="t0"),
+        Ticket(id="stale-2", thread_id="t0"),
+    ]
+    mock_wait_matching_result.side_effect = [
+        exceptions.NetworkError,
+        TimeoutError,
+        exceptions.NetworkError,
+        "t1",
+    ]
+    app = MatchApp()
+    async with app.run_test() as pilot:
+        await pilot.pause(0.1)
+        assert app.screen.name == "t1"
+    assert mock_wait_matching_result.call_count == 4
+    assert {c.args[0] for c in mock_delete_ticket.call_args_list} == {
+        "stale-1",
+        "stale-2",
+        "waiting",
+    }
+
+
+@mock.patch.object(MatchScreen, "RETRY_BASE", 0.001)
+@mock.patch.object(MatchScreen, "RETRY_BUDGET", 2)
+@mock.patch("app.ticket.TicketService.wait_matching_result")
+@mock.patch("app.ticket.TicketService.get_tickets")
+async def test_matching_stops_when_retry_budget_is_spent(
+    mock_get_tickets, mock_wait_matching_result
+):
+    mock_get_tickets.return_value = [Ticket(id="waiting", thread_id=None)]
+    mock_wait_matching_result.side_effect = exceptions.NetworkError
+    app = MatchApp()
+    async with app.run_test() as pilot:
+        await pilot.pause(0.1)
+        screen = app.screen
+        assert mock_wait_matching_result.call_count == 3
+        assert not screen.waiting
+        assert "press ↩ to retry" in str(screen.query_one(Static).renderable)
+
+
+@mock.patch("app.ticket.TicketService.delete_ticket")
+@mock.patch("app.ticket.TicketService.get_tickets")
+async def test_tickets_are_not_picked_up_again_after_a_modal(
+    mock_get_tickets, mock_delete_ticket
+):
+    mock_get_tickets.return_value = [Ticket(id="stale", thread_id="t0")]
+    app = MatchApp()
+    async with app.run_test() as pilot:
+        await pilot.pause()
+        await app.push_screen(ModalScreen())
+        await pilot.pause()
+        app.pop_screen()
+        await pilot.pause()
+    mock_get_tickets.assert_called_once()
+    mock_delete_ticket.assert_called_once_with("stale")
+
+
+def test_peek_does_not_move_the_context():
+    context = ScreenContext()
+    context.set_state(LoginState())
+    assert context.peek() is MatchScreen
+    assert context.peek() is MatchScreen
+    assert context.next() is MatchScreen
+    assert context.peek() is ChatScreen
+
+
+class CycleApp(App):
+    def __init__(self, token: str) -> None:
+        self.session = Session()
+        self.session.cache.set("jwt", JWT(token))
+        super().__init__()
+
+    def on_mount(self):
+        self.screen_context = ScreenContext(self)
+        self.screen_context.set_state(LoginState())
+        screen = self.screen_context.screen(self.screen_context.next(), "alice")
+        self.push_screen(screen)
+
+
+@mock.patch("app.widgets.chat.MessageDownlink", FakeDownlink)
+@mock.patch("app.widgets.chat.ChatScreen.listen_notification")
+@mock.patch("app.stream.MessageUplink.connect")
+@mock.patch("app.user.UserService.fetch_thread_ids")
+@mock.patch("app.user.ThreadService.fetch_old_messages")
+@mock.patch("app.ticket.TicketService.delete_ticket")
+@mock.patch("app.ticket.TicketService.wait_matching_result")
+@mock.patch("app.user.UserService.start_matching")
+@mock.patch("app.ticket.TicketService.get_tickets")
+async def test_screens_are_reused_across_matches(
+    mock_get_tickets,
+    mock_start_matching,
+    mock_wait_matching_result,
+    mock_delete_ticket,
+    mock_fetch_old_messages,
+    mock_fetch_thread_ids,
+    mock_connect,
+    mock_listen_notification,
+    alice_jwt: str,
+):
+    mock_get_tickets.return_value = []
+    mock_start_matching.return_value = "ticket"
+    mock_fetch_old_messages.return_value = []
+    mock_fetch_thread_ids.return_value = []
+    FakeDownlink.frames = []
+    matched = asyncio.Queue[str]()
+
+    async def wait_matching_result(ticket_id):
+        return await matched.get()
+
+    mock_wait_matching_result.side_effect = wait_matching_result
+    app = CycleApp(alice_jwt)
+    async with app.run_test() as pilot:
+        match_screen = app.screen
+        await pilot.press("enter")
+        await pilot.pause()
+        # the chat screen is built and mounted off the stack while matching,
+        # and opens the upstream socket
+        chat_screen = app.get_screen("ChatScreen")
+        assert isinstance(chat_screen, ChatScreen)
+        assert chat_screen.is_running
+        assert app.screen is match_screen
+        assert app.screen_stack == [app.screen_stack[0], match_screen]
+        mock_connect.assert_called_once()
+
+        matched.put_nowait("t1")
+        await pilot.pause(0.1)
+        assert app.screen is chat_screen
+        assert list(chat_screen.threads) == ["t1"]
+        assert chat_screen.thread.size.width > 0
+
+        await pilot.press("ctrl+n")
+        await pilot.pause()
+        assert app.screen is match_screen
+        assert "Press ↩ to match" in str(match_screen.query_one(Static).renderable)
+        await pilot.press("enter")
+        matched.put_nowait("t2")
+        await pilot.pause(0.1)
+        assert app.screen is chat_screen
+        assert list(chat_screen.threads) == ["t1", "t2"]
+        assert chat_screen.thread_id == "t2"
+    assert mock_get_tickets.call_count == 2
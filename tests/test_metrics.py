@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from app.metrics import Metrics
+
+
+def test_timer_counts_errors_by_type():
+    metrics = Metrics()
+    with metrics.timer("service_call_seconds", call="users.create"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.timer("service_call_seconds", call="users.create"):
+            raise ValueError
+    histogram = metrics.histograms[
+        ("service_call_seconds", (("call", "users.create"),))
+    ]
+    assert histogram.count == 2
+    assert metrics.counters == {
+        (
+            "service_call_errors_total",
+            (("call", "users.create"), ("error", "ValueError")),
+        ): 1
+    }
+
+
+def test_labels_may_share_names_with_parameters():
+    metrics = Metrics()
+    metrics.inc("orders_total", 2, amount="large", name="x")
+    assert metrics.counter("orders_total", amount="large", name="x") == 2
+    with pytest.raises(KeyError):
+        with metrics.timer("refund_seconds", amount="large", error="stale"):
+            raise KeyError
+    assert metrics.histogram("refund_seconds", amount="large", error="stale").count
+    assert metrics.counter("refund_errors_total", amount="large", error="KeyError")
+
+
+def test_snapshot_exports():
+    metrics = Metrics()
+    metrics.inc("stream_frames_total", stream="messages_down")
+    metrics.inc("stream_frames_total", 2, stream="messages_down")
+    metrics.observe("render_seconds", 0.003, stage="lines")
+    snapshot = json.loads(metrics.to_json())
+    assert snapshot["counters"] == [
+        {
+            "name": "stream_frames_total",
+            "labels": {"stream": "messages_down"},
+            "value": 3,
+        }
+    ]
+    assert snapshot["histograms"][0]["count"] == 1
+    text = metrics.to_prometheus()
+    assert "# TYPE stream_frames_total counter" in text
+    assert 'stream_frames_total{stream="messages_down"} 3' in text
+    assert "# TYPE render_seconds histogram" in text
+    assert 'render_seconds_bucket{stage="lines",le="0.0025"} 0' in text
+    assert 'render_seconds_bucket{stage="lines",le="0.005"} 1' in text
+    assert 'render_seconds_bucket{stage="lines",le="+Inf"} 1' in text
+    assert 'render_seconds_count{stage="lines"} 1' in text
@@ -0,0 +1,119 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+FIRST_PAINT = "Press ↩ to login"
+BURST = 4
+
+
+def web_env() -> dict[str, str]:
+    # what textual-web sets for the session command
+    return {
+        **os.environ,
+        "TEXTUAL_DRIVER": "textual.drivers.web_driver:WebDriver",
+        "TEXTUAL_COLOR_SYSTEM": "truecolor",
+        "COLUMNS": "80",
+        "ROWS": "24",
+    }
+
+
+def start_session(*command: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *command],
+        cwd=ROOT,
+        env=web_env(),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_first_paint(proc: subprocess.Popen, timeout: float = 20):
+    """Read the web driver's packets until the login screen is on them."""
+    assert proc.stdout is not None
+    deadline = time.monotonic() + timeout
+    assert proc.stdout.readline() == b"__GANGLION__\n"
+    while time.monotonic() < deadline:
+        kind = proc.stdout.read(1)
+        assert kind, "session exited before painting"
+        size = int.from_bytes(proc.stdout.read(4), "big")
+        payload = proc.stdout.read(size)
+        if kind == b"D" and FIRST_PAINT in payload.decode():
+            return
+    raise TimeoutError
+
+
+def quit_session(proc: subprocess.Popen) -> int:
+    assert proc.stdin is not None
+    meta = json.dumps({"type": "quit"}).encode()
+    proc.stdin.write(b"M" + len(meta).to_bytes(4, "big") + meta)
+    proc.stdin.close()
+    return proc.wait(10)
+
+
+def time_to_first_paint(*command: str, sessions: int = 1) -> float:
+    """Start `sessions` at once and return the slowest first paint in seconds."""
+    started = time.perf_counter()
+    procs = [start_session(*command) for _ in range(sessions)]
+    try:
+        for proc in procs:
+            wait_first_paint(proc)
+        return time.perf_counter() - started
+    finally:
+        for proc in procs:
+            assert quit_session(proc) == 0
+
+
+@pytest.fixture
+def pool(tmp_path):
+    path = str(tmp_path / "pool.sock")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.pool", "serve", "--size", str(BURST)]
+        + ["--socket", path],
+        cwd=ROOT,
+    )
+    deadline = time.monotonic() + 20
+    while not os.path.exists(path):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    # let the workers finish forking before measuring
+    time.sleep(1)
+    yield path
+    server.terminate()
+    assert server.wait(10) == 0
+
+
+def test_pooled_session_runs_the_app(pool: str):
+    proc = start_session("-m", "app.pool", "connect", "--socket", pool)
+    wait_first_paint(proc)
+    assert quit_session(proc) == 0
+
+
+def test_session_starts_cold_without_a_pool(tmp_path):
+    missing = str(tmp_path / "missing.sock")
+    proc = start_session("-m", "app.pool", "connect", "--socket", missing)
+    wait_first_paint(proc)
+    assert quit_session(proc) == 0
+
+
+def test_pooled_session_time_to_first_paint(pool: str):
+    cold = time_to_first_paint("-m", "app.app")
+    warm = time_to_first_paint("-m", "app.pool", "connect", "--socket", pool)
+    cold_burst = time_to_first_paint("-m", "app.app", sessions=BURST)
+    time.sleep(1)
+    warm_burst = time_to_first_paint(
+        "-m", "app.pool", "connect", "--socket", pool, sessions=BURST
+    )
+    print(
+        f"time to first paint: cold {cold * 1000:.0f} ms, pooled {warm * 1000:.0f} ms;"
+        f" burst of {BURST}: cold {cold_burst * 1000:.0f} ms,"
+        f" pooled {warm_burst * 1000:.0f} ms"
+    )
+    assert warm < cold
+    assert warm_burst < cold_burst
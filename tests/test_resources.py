@@ -0,0 +1,107 @@
+import asyncio
+import os
+
+import pytest
+
+from app.app import RandomChatApp
+from app.base import Service
+from app.fake_server import FakeServer
+from app.resources import SOCKET, STREAM, TASK, Resources
+from app.session import Session
+from app.widgets.chat import ChatScreen
+from app.widgets.match import MatchScreen
+from tests.test_services import sign_up
+
+CYCLES = 8
+
+
+async def test_counts_and_closes_tasks():
+    resources = Resources()
+    task = resources.spawn(asyncio.Event().wait())
+    with resources.hold(SOCKET):
+        assert resources.counts() == {SOCKET: 1, STREAM: 0, TASK: 1}
+    with pytest.warns(ResourceWarning):
+        with resources.hold(STREAM):
+            await resources.aclose()
+    assert task.cancelled()
+    assert resources.counts() == {SOCKET: 0, STREAM: 0, TASK: 0}
+
+
+async def until(pilot, predicate, timeout: float = 5):
+    async with asyncio.timeout(timeout):
+        while not predicate():
+            await pilot.pause(0.02)
+
+
+def server_sockets(port: int) -> tuple[int, int]:
+    """Count this process's fds for client and server ends of TCP `port`."""
+    ends: dict[str, tuple[bool, bool]] = {}
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        with open(table) as f:
+            for line in list(f)[1:]:
+                _, local, remote, *_, inode = line.split()[:10]
+                ends[inode] = (
+                    int(local.rsplit(":", 1)[1], 16) == port,
+                    int(remote.rsplit(":", 1)[1], 16) == port,
+                )
+    clients = servers = 0
+    for fd in os.listdir("/proc/self/fd"):
+        try:
+            target = os.readlink(f"/proc/self/fd/{fd}")
+        except FileNotFoundError:
+            continue
+        server, client = ends.get(target.removeprefix("socket:[")[:-1], (0, 0))
+        clients += client
+        servers += server
+    return clients, servers
+
+
+def open_resources(app: RandomChatApp, port: int) -> dict[str, int]:
+    counts = app.session.resources.counts()
+    # keep-alive connections come and go with request timing, and each one is
+    # a socket pair with the in-process server, so they are counted apart
+    clients, servers = server_sockets(port)
+    return {
+        **counts,
+        "worker": sum(1 for worker in app.workers if worker.is_running),
+        "fd": len(os.listdir("/proc/self/fd")) - clients - servers,
+        "pooled": clients - counts[SOCKET],
+    }
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+async def test_match_cycles_do_not_leak(fake_server: FakeServer):
+    port = int(fake_server.domain.rsplit(":", 1)[1])
+    alice = Session()
+    await sign_up(alice)
+    app = RandomChatApp()
+    samples = []
+    async with app.run_test() as pilot:
+        secret = await app.session.users.create()
+        await pilot.press(*secret, "enter")
+        await until(pilot, lambda: isinstance(app.screen, MatchScreen))
+        for _ in range(CYCLES):
+            await pilot.press("enter")
+            ticket_id = await alice.users.start_matching()
+            thread_id = await alice.tickets.wait_matching_result(ticket_id)
+            await alice.tickets.delete_ticket(ticket_id)
+            await until(
+                pilot,
+                lambda: (
+                    isinstance(app.screen, ChatScreen)
+                    and thread_id in app.screen.threads
+                ),
+            )
+            await alice.threads.leave(thread_id)
+            await until(pilot, lambda: isinstance(app.screen, MatchScreen))
+            # let the sockets of the left thread close
+            await pilot.pause(0.2)
+            samples.append(open_resources(app, port))
+    await alice.aclose()
+    pooled = [sample.pop("pooled") for sample in samples]
+    # the first cycle builds the chat screen, later ones must not grow
+    assert all(sample == samples[1] for sample in samples[1:])
+    # the app's pool and alice's stay within their limits
+    assert max(pooled) <= 2 * Service.MAX_CONNECTIONS
+    assert samples[-1][SOCKET] == 1  # the upstream socket, kept for the session
+    assert app.session.resources.counts() == {SOCKET: 0, STREAM: 0, TASK: 0}
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from app import exceptions
+from app.fake_server import FakeServer
+from app.session import Session
+from app.stream import MessageDownlink
+
+
+async def sign_up(session: Session) -> str:
+    secret = await session.users.create()
+    jwt = await session.tokens.login(secret)
+    return jwt.user_id
+
+
+async def match(alice: Session, bob: Session) -> str:
+    tickets = await asyncio.gather(
+        alice.users.start_matching(), bob.users.start_matching()
+    )
+    thread_ids = await asyncio.gather(
+        alice.tickets.wait_matching_result(tickets[0]),
+        bob.tickets.wait_matching_result(tickets[1]),
+    )
+    assert thread_ids[0] == thread_ids[1]
+    return thread_ids[0]
+
+
+@pytest.fixture
+async def sessions(fake_server: FakeServer):
+    alice, bob = Session(), Session()
+    await sign_up(alice)
+    await sign_up(bob)
+    yield alice, bob
+    await alice.aclose()
+    await bob.aclose()
+
+
+async def test_login(fake_server: FakeServer):
+    session = Session()
+    user_id = await sign_up(session)
+    assert session.user_id == user_id
+    assert await session.users.fetch_thread_ids() == []
+    with pytest.raises(exceptions.IncorrectPassword):
+        await session.jwt.login("wrong")
+    await session.aclose()
+
+
+async def test_matching(sessions):
+    alice, bob = sessions
+    thread_id = await match(alice, bob)
+    assert [t.thread_id for t in await alice.tickets.get_tickets()] == [thread_id]
+    ticket = (await bob.tickets.get_tickets())[0]
+    await bob.tickets.delete_ticket(ticket.id)
+    assert await bob.tickets.get_tickets() == []
+    with pytest.raises(exceptions.WrongTicket):
+        await alice.tickets.wait_matching_result(ticket.id)
+    assert await bob.users.fetch_thread_ids() == [thread_id]
+
+
+async def test_service_calls_are_timed(sessions):
+    alice, bob = sessions
+    thread_id = await match(alice, bob)
+    downlink = aiter(MessageDownlink(bob, {thread_id: 0.0}))
+    await alice.uplink.send(thread_id, "hi bob")
+    await asyncio.wait_for(anext(downlink), 5)
+    await downlink.aclose()
+    with pytest.raises(exceptions.WrongTicket):
+        await alice.tickets.wait_matching_result("unknown")
+    snapshot = alice.metrics.snapshot()
+    calls = {
+        h["labels"]["call"]: h["count"]
+        for h in snapshot["histograms"]
+        if h["name"] == "service_call_seconds"
+    }
+    assert calls == {
+        "users.create": 1,
+        "jwt.login": 1,
+        "users.start_matching": 1,
+        "tickets.wait_matching_result": 2,
+    }
+    counters = {
+        (c["name"], *c["labels"].values()): c["value"] for c in snapshot["counters"]
+    }
+    assert (
+        counters[
+            ("service_call_errors_total", "tickets.wait_matching_result", "WrongTicket")
+        ]
+        == 1
+    )
+    assert counters[("stream_frames_total", "messages_up")] == 1
+    assert (
+        bob.metrics.counters[("stream_frames_total", (("stream", "messages_down"),))]
+        == 1
+    )
+
+
+async def test_messages_round_trip(sessions):
+    alice, bob = sessions
+    thread_id = await match(alice, bob)
+    downlink = aiter(MessageDownlink(bob, {thread_id: 0.0}))
+    await alice.uplink.send(thread_id, "hi bob")
+    msg = await asyncio.wait_for(anext(downlink), 5)
+    assert (msg.message, msg.user_id) == ("hi bob", alice.user_id)
+    await downlink.aclose()
+    history = await bob.threads.fetch_old_messages(thread_id, msg.time + 1)
+    assert [m.id for m in history] == [msg.id]
+
+
+async def test_notifications_and_leave(sessions):
+    alice, bob = sessions
+    thread_id = await match(alice, bob)
+    offset = await bob.notifications.get_last_read_offset()
+    stream = aiter(bob.notifications.iterate(offset))
+    joined = await asyncio.wait_for(anext(stream), 5)
+    assert joined["code"] == "thread_joined"
+    await bob.notifications.update_last_read_offset(joined["time"])
+    await alice.threads.leave(thread_id)
+    left = await asyncio.wait_for(anext(stream), 5)
+    assert (left["code"], left["details"]) == (
+        "thread_leaved",
+        {"thread_id": thread_id},
+    )
+    await stream.aclose()
+    assert await bob.notifications.get_last_read_offset() == pytest.approx(
+        joined["time"], abs=1e-3
+    )
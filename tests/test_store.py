@@ -0,0 +1,52 @@
+from app.store import MessageStore
+from app.user import ThreadMessage
+
+
+def test_store_returns_latest_messages_in_order():
+    store = MessageStore("alice")
+    msgs = [
+        ThreadMessage(id=str(i), time=float(i), user_id="bob", message=str(i))
+        for i in range(10)
+    ]
+    store.save("t1", reversed(msgs))
+    store.save("t1", msgs[:3])
+    store.save("t2", [ThreadMessage(id="x", time=99.0, user_id="bob", message="x")])
+    assert [m.id for m in store.latest("t1", 3)] == ["7", "8", "9"]
+    assert len(store.latest("t1", 100)) == 10
+    store.close()
+
+
+def test_store_persists_per_user(data_dir):
+    store = MessageStore("alice")
+    store.save("t1", [ThreadMessage(id="a", time=1.0, user_id="bob", message="hi")])
+    store.close()
+    assert (data_dir / "alice.sqlite3").exists()
+    assert MessageStore("alice").latest("t1", 10)[0].message == "hi"
+    assert MessageStore("bob").latest("t1", 10) == []
+
+
+def test_store_keeps_outbox_in_order_across_restarts():
+    store = MessageStore("alice")
+    first = store.enqueue("t1", "alice", "one", 1.0)
+    store.enqueue("t2", "alice", "two", 2.0)
+    store.enqueue("t1", "alice", "three", 3.0)
+    store.close()
+    store = MessageStore("alice")
+    assert [m.message for m in store.queued()] == ["one", "two", "three"]
+    assert [m.message for m in store.queued("t1")] == ["one", "three"]
+    store.dequeue(first)
+    store.discard_queued("t2")
+    assert [m.message for m in store.queued()] == ["three"]
+    assert store.latest("t1", 10) == []
+
+
+def test_store_writes_received_messages_off_the_caller():
+    store = MessageStore("alice")
+    for i in range(5):
+        msg = ThreadMessage(id=str(i), time=float(i), user_id="bob", message=str(i))
+        store.save_later("t1", [msg])
+    store.close()
+    store = MessageStore("alice")
+    assert [m.id for m in store.latest("t1", 10)] == ["0", "1", "2", "3", "4"]
+    assert store.conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    store.close()
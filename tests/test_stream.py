@@ -0,0 +1,267 @@
+import asyncio
+import json
+from unittest import mock
+
+import pytest
+import websockets
+
+from app import exceptions
+from app.backoff import Backoff
+from app.framing import JSONFramer
+from app.jwt import JWT
+from app.session import Session
+from app.store import MessageStore
+from app.stream import (
+    MessageDownlink,
+    MessageUplink,
+    NotificationHub,
+    OffsetCommitter,
+    Outbox,
+    coalesce,
+)
+from app.user import NotificationService, ThreadMessage, ThreadService
+
+
+@pytest.fixture
+def logged_in(alice_jwt: str):
+    session = Session()
+    session.cache.set("secret", "secret")
+    session.cache.set("jwt", JWT(alice_jwt))
+    return session
+
+
+@pytest.fixture
+async def ws_server():
+    received = []
+    connections = []
+
+    async def handler(ws):
+        connections.append(ws)
+        async for frame in ws:
+            received.append(json.loads(frame))
+
+    async with websockets.serve(handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        yield f"ws://127.0.0.1:{port}", received, connections
+
+
+async def test_uplink_reuses_one_connection(logged_in, ws_server):
+    url, received, connections = ws_server
+    uplink = MessageUplink(logged_in)
+    uplink.WS_BASE_URL = url
+    for i in range(5):
+        await uplink.send("t1", f"msg {i}")
+    await asyncio.sleep(0.05)
+    await uplink.aclose()
+    assert len(connections) == 1
+    assert [r["text"] for r in received] == [f"msg {i}" for i in range(5)]
+
+
+async def test_uplink_reconnects_after_close(logged_in, ws_server):
+    url, received, connections = ws_server
+    uplink = MessageUplink(logged_in)
+    uplink.WS_BASE_URL = url
+    await uplink.send("t1", "first")
+    await connections[0].close()
+    await asyncio.sleep(0.05)
+    await uplink.send("t1", "second")
+    await asyncio.sleep(0.05)
+    await uplink.aclose()
+    assert len(connections) == 2
+    assert [r["text"] for r in received] == ["first", "second"]
+
+
+async def test_downlink_resumes_and_drops_duplicates(logged_in):
+    offsets = []
+
+    def frame(id: str, time: float) -> str:
+        return json.dumps({"id": id, "uid": "bob", "text": id, "time": time})
+
+    async def handler(ws):
+        offsets.append(json.loads(await ws.recv()))
+        if len(offsets) == 1:
+            await ws.send(frame("a", 1.0))
+            await ws.send(frame("b", 2.0))
+        else:
+            await ws.send(frame("b", 2.0))
+            await ws.send(frame("c", 3.0))
+            await ws.wait_closed()
+
+    states = []
+    async with websockets.serve(handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        downlink = MessageDownlink(logged_in, {"t1": 0.0}, on_state=states.append)
+        with mock.patch.object(ThreadService, "WS_BASE_URL", f"ws://127.0.0.1:{port}"):
+            ids = []
+            async for msg in downlink:
+                ids.append(msg.id)
+                if len(ids) == 3:
+                    break
+    assert ids == ["a", "b", "c"]
+    assert offsets == [{"t1": 0.0}, {"t1": 2.0}]
+    assert states == [False, True]
+
+
+async def test_coalesce_batches_bursts():
+    async def burst():
+        for i in range(100):
+            yield i
+        await asyncio.sleep(0.05)
+        yield 100
+
+    batches = [batch async for batch in coalesce(burst(), 0.01)]
+    assert batches == [list(range(100)), [100]]
+
+
+async def test_coalesce_reraises_source_error():
+    async def broken():
+        yield 1
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        async for _ in coalesce(broken(), 0.01):
+            pass
+
+
+def test_json_framer_handles_split_and_joined_documents():
+    framer = JSONFramer()
+    assert framer.feed('{"code": "a", "ti') == []
+    assert framer.feed('me": 1}\n{"code": "b", "time": 2}{"code"') == [
+        {"code": "a", "time": 1},
+        {"code": "b", "time": 2},
+    ]
+    assert framer.feed(': "c", "time": 3}\n') == [{"code": "c", "time": 3}]
+    assert framer.feed('{"time": 4.') == []
+    assert framer.feed("5}") == [{"time": 4.5}]
+
+
+def test_json_framer_skips_invalid_documents():
+    framer = JSONFramer()
+    assert framer.feed('{"code": x}\n{"code": "a"}{bad}{"code": "b"}') == [
+        {"code": "a"},
+        {"code": "b"},
+    ]
+    assert framer.feed('{"code": tru') == []
+    assert framer.feed("e}") == [{"code": True}]
+    assert framer.skipped == 2
+
+
+async def test_offset_committer_coalesces_commits():
+    commits = []
+
+    async def commit(offset: float):
+        commits.append(offset)
+
+    committer = OffsetCommitter(commit, interval=0.01)
+    for offset in (1.0, 3.0, 2.0):
+        committer.mark(offset)
+    await asyncio.sleep(0.05)
+    assert commits == [3.0]
+    committer.mark(4.0)
+    await committer.aclose()
+    assert commits == [3.0, 4.0]
+
+
+async def test_notification_hub_resumes_and_dispatches(logged_in):
+    offsets = []
+
+    def notification(code: str, thread_id: str, time: float) -> dict:
+        return {"code": code, "time": time, "details": {"thread_id": thread_id}}
+
+    async def iterate(self, timestamp: float):
+        offsets.append(timestamp)
+        if len(offsets) == 1:
+            yield notification("thread_joined", "t1", 1.0)
+            yield notification("thread_leaved", "t2", 2.0)
+            raise exceptions.NetworkError
+        yield notification("thread_joined", "t3", 3.0)
+        await asyncio.Event().wait()
+
+    get_offset = mock.AsyncMock(return_value=0.5)
+    update_offset = mock.AsyncMock()
+    with mock.patch.multiple(
+        NotificationService,
+        iterate=iterate,
+        get_last_read_offset=get_offset,
+        update_last_read_offset=update_offset,
+    ):
+        hub = NotificationHub(logged_in)
+        hub._backoff = Backoff(base=0.01)
+        joined, t2, every = [], [], []
+        hub.subscribe(joined.append, "thread_joined")
+        hub.subscribe(t2.append, thread_id="t2")
+        unsubscribe = hub.subscribe(every.append, "thread_*")
+        hub.start()
+        hub.start()
+        await asyncio.sleep(0.05)
+        unsubscribe()
+        hub.dispatch(notification("thread_leaved", "t2", 4.0))
+        await hub.aclose()
+    assert offsets == [0.5, 2.0]
+    get_offset.assert_awaited_once()
+    update_offset.assert_awaited_once_with(3.0)
+    assert [n["details"]["thread_id"] for n in joined] == ["t1", "t3"]
+    assert [n["time"] for n in t2] == [2.0, 4.0]
+    assert len(every) == 3
+
+
+async def test_notification_hub_survives_unexpected_errors(logged_in):
+    async def iterate(self, timestamp: float):
+        if not logged_in.metrics.counter(
+            "stream_disconnects_total", stream="notifications"
+        ):
+            yield {"code": "thread_joined"}  # no time, the hub cannot advance
+        yield {"code": "thread_joined", "time": 1.0}
+        await asyncio.Event().wait()
+
+    with mock.patch.multiple(
+        NotificationService,
+        iterate=iterate,
+        get_last_read_offset=mock.AsyncMock(return_value=0.5),
+        update_last_read_offset=mock.AsyncMock(),
+    ):
+        hub = NotificationHub(logged_in)
+        hub._backoff = Backoff(base=0.01)
+        received = []
+        hub.subscribe(received.append)
+        hub.start()
+        await asyncio.sleep(0.05)
+        await hub.aclose()
+    assert [n.get("time") for n in received] == [None, 1.0]
+    assert hub.offset == 1.0
+    assert logged_in.metrics.counter(
+        "stream_errors_total", stream="notifications", error="KeyError"
+    )
+
+
+@mock.patch.object(Outbox, "RATE", 1000.0)
+@mock.patch.object(Outbox, "RETRY_BASE", 0.01)
+@mock.patch.object(Outbox, "ECHO_TIMEOUT", 0.05)
+async def test_outbox_keeps_messages_until_echoed(logged_in):
+    def echo(text: str) -> ThreadMessage:
+        return ThreadMessage(
+            id="s", time=0.0, user_id="alice", message=text, thread_id="t1"
+        )
+
+    store = MessageStore("alice")
+    results = []
+    outbox = Outbox(logged_in, store, on_result=lambda m, ok: results.append(ok))
+    with mock.patch.object(logged_in, "uplink") as uplink:
+        uplink.send = mock.AsyncMock()
+        hi = outbox.put("t1", "alice", "hi")
+        # not written yet, so a message with the same text is no echo
+        assert outbox.confirm(echo("hi")) is None
+        running = asyncio.create_task(outbox.run())
+        outbox.put("t1", "alice", "there")
+        await asyncio.sleep(0.01)
+        assert uplink.send.await_count == 2
+        assert outbox.confirm(echo("hi")) == hi
+        # the link dropped after "there" was written, it is failed and resent
+        await asyncio.sleep(0.1)
+        assert results[:3] == [True, True, False]
+        assert [c.args for c in uplink.send.await_args_list][-1] == ("t1", "there")
+        assert outbox.confirm(echo("there")) is not None
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+    assert store.queued() == []
+    store.close()
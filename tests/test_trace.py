@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from app.fake_server import FakeServer
+from app.session import Session
+from app.stream import MessageDownlink
+from app.trace import TraceRecorder, load, replay
+from tests.test_services import match, sign_up
+
+MESSAGES = 30
+
+
+async def record(path, messages: int):
+    """Record what bob's app would see while alice sends `messages`."""
+    alice, bob = Session(), Session(recorder=TraceRecorder(path))
+    await sign_up(alice)
+    await sign_up(bob)
+    thread_id = await match(alice, bob)
+    await bob.users.fetch_thread_ids()
+    await bob.threads.fetch_old_messages(thread_id, time.time())
+    offset = await bob.notifications.get_last_read_offset()
+    notifications = bob.notifications.iterate(offset)
+    await asyncio.wait_for(anext(notifications), 5)
+    downlink = aiter(MessageDownlink(bob, {thread_id: 0.0}))
+    for i in range(messages):
+        await alice.uplink.send(thread_id, f"message {i}")
+    for _ in range(messages):
+        await asyncio.wait_for(anext(downlink), 5)
+    await downlink.aclose()
+    await notifications.aclose()
+    await alice.aclose()
+    await bob.aclose()
+
+
+async def test_trace_leaves_out_secrets(fake_server: FakeServer, tmp_path):
+    path = tmp_path / "trace.jsonl"
+    await record(path, 1)
+    events = load(path)
+    text = path.read_text()
+    assert "access_token" not in text and "secret" not in text
+    kinds = {e["kind"] for e in events}
+    assert {"login", "response", "chunk", "frame"} <= kinds
+
+
+async def test_replay_renders_recorded_messages(fake_server: FakeServer, tmp_path):
+    path = tmp_path / "trace.jsonl"
+    await record(path, MESSAGES)
+    report = await replay(path, speed=20)
+    print(report.render())
+    assert report.sent == report.frames == MESSAGES
+    assert report.rendered == MESSAGES
+    assert report.batches.count >= 1
+    assert report.memory_peak > 0